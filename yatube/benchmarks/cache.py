@@ -0,0 +1,97 @@
+"""Бэкенды кэша: LocMemCache, FileBasedCache и общий SQLiteCache.
+
+Замеряет чтение горячих ключей, пакетное чтение страницы карточек,
+запись, а также долю попаданий у второго процесса после того, как
+первый заполнил кэш: только общий кэш делит прогрев между процессами.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks import print_table, setup
+
+KEYS = 2000
+HOT_KEYS = 200
+READS = 20000
+PAGE = 10
+VALUE = 'x' * 2000
+
+
+def backends(directory):
+    from django.core.cache.backends.filebased import FileBasedCache
+    from django.core.cache.backends.locmem import LocMemCache
+    from core.cache import SQLiteCache
+    params = {'OPTIONS': {'MAX_ENTRIES': KEYS * 2}}
+    sqlite = os.path.join(directory, 'cache.sqlite3')
+    return {
+        'locmem': lambda: LocMemCache('benchmark', params),
+        'filebased': lambda: FileBasedCache(
+            os.path.join(directory, 'files'), params
+        ),
+        'sqlite, no L1': lambda: SQLiteCache(sqlite, {
+            'OPTIONS': {'MAX_ENTRIES': KEYS * 2, 'L1_MAX_ENTRIES': 0}
+        }),
+        'sqlite + L1': lambda: SQLiteCache(sqlite, {
+            'OPTIONS': {'MAX_ENTRIES': KEYS * 2, 'L1_MAX_ENTRIES': 1000}
+        }),
+    }
+
+
+def per_op_us(started, operations):
+    return round((time.perf_counter() - started) / operations * 10 ** 6, 1)
+
+
+def hit_rate(name, directory, queue):
+    """Выполняется в новом процессе: читает уже заполненные ключи."""
+    setup()
+    cache = backends(directory)[name]()
+    found = cache.get_many([f'key{i}' for i in range(KEYS)])
+    queue.put(len(found) / KEYS)
+
+
+def run(name, directory):
+    cache = backends(directory)[name]()
+    cache.clear()
+    started = time.perf_counter()
+    for i in range(KEYS):
+        cache.set(f'key{i}', VALUE)
+    write = per_op_us(started, KEYS)
+    started = time.perf_counter()
+    for i in range(READS):
+        cache.get(f'key{i % HOT_KEYS}')
+    read = per_op_us(started, READS)
+    pages = READS // PAGE
+    started = time.perf_counter()
+    for i in range(pages):
+        first = i * PAGE % HOT_KEYS
+        cache.get_many([f'key{first + j}' for j in range(PAGE)])
+    page = per_op_us(started, pages)
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    worker = context.Process(
+        target=hit_rate, args=(name, directory, queue)
+    )
+    worker.start()
+    shared = queue.get()
+    worker.join()
+    return [name, write, read, page, f'{shared:.0%}']
+
+
+def main():
+    setup()
+    directory = tempfile.mkdtemp()
+    try:
+        rows = [run(name, directory) for name in backends(directory)]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print_table(
+        ['backend', 'set, us', 'get, us', f'get_many({PAGE}), us',
+         'hits in 2nd process'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Ленты подписок: чистый push против гибрида push/pull.
+
+Для нескольких распределений числа подписчиков публикует посты и
+сравнивает усиление записи (строк ленты на пост, время публикации)
+и задержку чтения первой и глубокой страницы ленты подписок.
+"""
+import random
+import statistics
+import time
+from unittest import mock
+
+from benchmarks import print_table, setup, temporary_database
+
+READERS = 500
+AUTHORS = 30
+POSTS_PER_AUTHOR = 10
+SAMPLE_READERS = 30
+
+# Сколько подписчиков у каждого автора
+DISTRIBUTIONS = {
+    'uniform': lambda rnd, i: 20,
+    'power-law': lambda rnd, i: min(int(10 * rnd.paretovariate(1.2)), READERS),
+    'one-star': lambda rnd, i: READERS if i == 0 else 10,
+}
+STRATEGIES = {
+    'push': 10 ** 9,
+    'hybrid': 100,
+}
+
+
+def populate(distribution):
+    from django.contrib.auth import get_user_model
+    from posts.management.commands.rebuild_timelines import Command
+    from posts.models import Follow
+    User = get_user_model()
+    rnd = random.Random(0)
+    User.objects.bulk_create(
+        [User(username=f'reader{i}') for i in range(READERS)]
+        + [User(username=f'author{i}') for i in range(AUTHORS)]
+    )
+    readers = list(User.objects.filter(username__startswith='reader'))
+    authors = list(
+        User.objects.filter(username__startswith='author').order_by('id')
+    )
+    follows = []
+    for i, author in enumerate(authors):
+        followers = rnd.sample(readers, DISTRIBUTIONS[distribution](rnd, i))
+        follows += [Follow(user=reader, author=author) for reader in followers]
+    Follow.objects.bulk_create(follows)
+    Command.recount_followers()
+    return readers, authors
+
+
+def run(distribution, threshold):
+    from django.db import connection
+    from django.test import RequestFactory
+    from posts.feeds import follow_feed
+    from posts.models import Post, TimelineEntry
+    with mock.patch('posts.feeds.FEED_CELEBRITY_THRESHOLD', threshold):
+        readers, authors = populate(distribution)
+        write_times = []
+        for _ in range(POSTS_PER_AUTHOR):
+            for author in authors:
+                start = time.perf_counter()
+                Post.objects.create(text='Текст', author=author)
+                write_times.append(time.perf_counter() - start)
+        rows = TimelineEntry.objects.count()
+        factory = RequestFactory()
+        sample = random.Random(1).sample(readers, SAMPLE_READERS)
+        first, deep = [], []
+        for reader in sample:
+            start = time.perf_counter()
+            page = follow_feed(reader, factory.get('/follow/'))
+            first.append(time.perf_counter() - start)
+            for _ in range(4):
+                if not page.has_next():
+                    break
+                request = factory.get('/follow/', {
+                    'page': page.next_page_number(),
+                    'cursor': page.paginator.next_cursor,
+                })
+                start = time.perf_counter()
+                page = follow_feed(reader, request)
+                deep.append(time.perf_counter() - start)
+    connection.close()
+    posts = len(write_times)
+    return [
+        distribution,
+        'push' if threshold > READERS else f'hybrid({threshold})',
+        f'{rows / posts:.1f}',
+        f'{statistics.mean(write_times) * 1000:.2f}',
+        f'{statistics.median(first) * 1000:.2f}',
+        f'{statistics.median(deep or [0]) * 1000:.2f}',
+    ]
+
+
+def main():
+    setup()
+    rows = []
+    for distribution in DISTRIBUTIONS:
+        for threshold in STRATEGIES.values():
+            with temporary_database():
+                rows.append(run(distribution, threshold))
+    print_table(
+        ['followers', 'strategy', 'rows/post', 'write ms',
+         'read p1 ms', 'read deep ms'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""Конкурентные чтение и запись в SQLite: настройки по умолчанию против
+core.backends.sqlite3 (WAL, PRAGMA, постоянные соединения).
+
+Читатели в нескольких процессах открывают первую страницу ленты,
+писатели ставят и снимают лайки и пишут комментарии в транзакциях, как
+представления. После каждой операции соединения закрываются так же, как
+в конце запроса. Печатает пропускную способность, задержки, ошибки
+«database is locked» и время ожидания блокировки записи. Операции
+в секунду — только успешные.
+"""
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks import print_table
+
+READERS = 4
+WRITERS = 2
+DURATION = 3
+USERS = 50
+POSTS = 300
+PAGE = 10
+
+CONFIGS = {
+    'sqlite3 default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+    },
+    'core.backends.sqlite3': {
+        'ENGINE': 'core.backends.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'cache_size': -64 * 1024,
+            'mmap_size': 256 * 1024 * 1024,
+            'busy_timeout': 5000,
+        },
+    },
+}
+
+
+def configure(config, directory):
+    """Подменяет базу до первого соединения; кэш — свой у процесса."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    from django.conf import settings
+    settings.DATABASES['default'] = {
+        **CONFIGS[config],
+        'NAME': os.path.join(directory, 'db.sqlite3'),
+    }
+    settings.CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }}
+    import django
+    django.setup()
+
+
+def prepare(config, directory):
+    configure(config, directory)
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from posts.models import Post
+    call_command('migrate', verbosity=0)
+    User = get_user_model()
+    User.objects.bulk_create(
+        [User(username=f'user{i}') for i in range(USERS)]
+    )
+    authors = list(User.objects.all())
+    rnd = random.Random(0)
+    for i in range(POSTS):
+        Post.objects.create(text=f'Пост {i}', author=rnd.choice(authors))
+
+
+def reader(config, directory, queue):
+    configure(config, directory)
+    from django.db import OperationalError, close_old_connections
+    from posts.models import Like, Post
+    user_id = 1
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + DURATION
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            page = list(
+                Post.objects.select_related('author')[:PAGE]
+            )
+            list(Like.objects.filter(
+                user_id=user_id, post__in=page
+            ).values_list('post_id', flat=True))
+        except OperationalError:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - started)
+        close_old_connections()
+    queue.put(('read', latencies, errors, None))
+
+
+def writer(config, directory, seed, queue):
+    configure(config, directory)
+    from django.db import (OperationalError, close_old_connections,
+                           transaction)
+    from core.backends.sqlite3.base import lock_waits
+    from posts.models import Comment, Like
+    rnd = random.Random(seed)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + DURATION
+    while time.perf_counter() < deadline:
+        user_id = rnd.randint(1, USERS)
+        post_id = rnd.randint(1, POSTS)
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                if rnd.random() < 0.3:
+                    Comment.objects.create(
+                        post_id=post_id, author_id=user_id, text='Текст'
+                    )
+                else:
+                    like, created = Like.objects.get_or_create(
+                        user_id=user_id, post_id=post_id
+                    )
+                    if not created:
+                        like.delete()
+        except OperationalError:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - started)
+        close_old_connections()
+    queue.put(('write', latencies, errors, lock_waits.snapshot()[1]))
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run(config):
+    directory = tempfile.mkdtemp()
+    context = multiprocessing.get_context('spawn')
+    try:
+        process = context.Process(target=prepare, args=(config, directory))
+        process.start()
+        process.join()
+        queue = context.Queue()
+        workers = [
+            context.Process(target=reader, args=(config, directory, queue))
+            for _ in range(READERS)
+        ] + [
+            context.Process(
+                target=writer, args=(config, directory, seed, queue)
+            )
+            for seed in range(WRITERS)
+        ]
+        for worker in workers:
+            worker.start()
+        results = [queue.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    row = [config]
+    for kind in ('read', 'write'):
+        latencies = [
+            latency for result in results if result[0] == kind
+            for latency in result[1]
+        ]
+        errors = sum(result[2] for result in results if result[0] == kind)
+        p95 = percentile(latencies, 0.95)
+        row += [
+            f'{len(latencies) / DURATION:.0f}',
+            f'{p95 * 1000:.2f}',
+            errors,
+        ]
+    if CONFIGS[config]['ENGINE'] == 'core.backends.sqlite3':
+        waited = sum(
+            result[3] for result in results if result[0] == 'write'
+        )
+        row.append(f'{waited * 1000:.0f}')
+    else:
+        row.append('-')
+    return row
+
+
+def main():
+    rows = [run(config) for config in CONFIGS]
+    print_table(
+        ['backend', 'reads/s', 'read p95 ms', 'read errors',
+         'writes/s', 'write p95 ms', 'write errors', 'lock wait ms'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
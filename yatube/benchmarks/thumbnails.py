@@ -0,0 +1,119 @@
+"""Хранилища метаданных sorl-thumbnail: cached_db из sorl и core.kvstore.
+
+Замеряет проверки миниатюр для страницы ленты: на каждую картинку
+карточки sorl при готовой миниатюре делает по одному чтению хранилища
+на вариант. Холодная страница — первая в процессе после очистки кэша,
+тёплая — повтор в том же процессе. Сами файлы не читаются: проверяется
+только путь попадания, который проходит каждая отрисовка.
+"""
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks import print_table, setup, temporary_database
+
+PAGES = 20
+PAGE = 10
+VARIANTS = 6
+REPEATS = 5
+
+
+def stores():
+    from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDB
+    from core.kvstore import KVStore
+    return {
+        'sorl cached_db': (CachedDB, False),
+        'core.kvstore': (KVStore, False),
+        'core.kvstore + preload': (KVStore, True),
+    }
+
+
+def image_file(name, size):
+    from sorl.thumbnail.images import ImageFile
+    image = ImageFile(name)
+    image.set_size(size)
+    return image
+
+
+def populate(store):
+    pages = []
+    for page in range(PAGES):
+        names, thumbnails = [], []
+        for post in range(PAGE):
+            source = image_file(f'posts/{page}/{post}.jpg', (1600, 1200))
+            store.set(source)
+            for variant in range(VARIANTS):
+                thumbnail = image_file(
+                    f'cache/{page}/{post}/{variant}.jpg', (320, 240)
+                )
+                store.set(thumbnail, source)
+                thumbnails.append(thumbnail)
+            names.append(source.name)
+        pages.append((names, thumbnails))
+    return pages
+
+
+def render(store, preload, names, thumbnails):
+    from django.db import connection
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        started = time.perf_counter()
+        if preload:
+            store.preload(names)
+        for thumbnail in thumbnails:
+            store.get(thumbnail)
+        elapsed = time.perf_counter() - started
+    return elapsed * 1000, len(queries)
+
+
+def run(name, store_class, preload):
+    from django.core.cache import cache
+    pages = populate(store_class())
+    cold, warm, queries = [], [], []
+    for _ in range(REPEATS):
+        cache.clear()
+        store = store_class()
+        for names, thumbnails in pages:
+            elapsed, count = render(store, preload, names, thumbnails)
+            cold.append(elapsed)
+            queries.append(count)
+            warm.append(render(store, preload, names, thumbnails)[0])
+    return [
+        name,
+        f'{statistics.median(cold):.2f}',
+        f'{statistics.median(queries):.0f}',
+        f'{statistics.median(warm):.2f}',
+    ]
+
+
+def main():
+    setup()
+    from django.test import override_settings
+    directory = tempfile.mkdtemp()
+    caches = {'default': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+    }}
+    rows = []
+    try:
+        with override_settings(CACHES=caches):
+            for name, (store_class, preload) in stores().items():
+                with temporary_database():
+                    rows.append(run(name, store_class, preload))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print_table(
+        ['store', 'cold page, ms', 'cold queries', 'warm page, ms'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""SQLite с WAL, настраиваемыми PRAGMA и учётом ожидания блокировки.
+
+Параметры берутся из OPTIONS базы и в sqlite3.connect не передаются:
+journal_mode, synchronous, cache_size, mmap_size, busy_timeout
+(миллисекунды) и lock_wait_warning — с какого ожидания записи, в
+миллисекундах, писать предупреждение в лог.
+
+Транзакции atomic() начинаются с BEGIN IMMEDIATE: блокировка записи
+берётся сразу, и её ожидание — это время BEGIN. Отложенная транзакция
+узнала бы о чужой записи только на первом UPDATE и в режиме WAL
+получила бы «database is locked» без ожидания.
+"""
+import logging
+import threading
+import time
+
+from django.db.backends.sqlite3 import base
+
+logger = logging.getLogger(__name__)
+
+PRAGMAS = ('journal_mode', 'synchronous', 'cache_size', 'mmap_size',
+           'busy_timeout')
+OWN_OPTIONS = PRAGMAS + ('lock_wait_warning',)
+
+
+class LockWaits:
+    """Сколько транзакций записи начал процесс и сколько секунд они
+    в сумме ждали блокировку."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.transactions = 0
+        self.seconds = 0.0
+
+    def add(self, seconds):
+        with self.lock:
+            self.transactions += 1
+            self.seconds += seconds
+
+    def snapshot(self):
+        with self.lock:
+            return self.transactions, self.seconds
+
+
+lock_waits = LockWaits()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        for option in OWN_OPTIONS:
+            kwargs.pop(option, None)
+        busy_timeout = self.settings_dict['OPTIONS'].get('busy_timeout')
+        if busy_timeout is not None:
+            kwargs['timeout'] = busy_timeout / 1000
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        options = self.settings_dict['OPTIONS']
+        for pragma in PRAGMAS:
+            if options.get(pragma) is not None:
+                conn.execute(f'PRAGMA {pragma} = {options[pragma]}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        started = time.perf_counter()
+        self.cursor().execute('BEGIN IMMEDIATE')
+        waited = time.perf_counter() - started
+        lock_waits.add(waited)
+        threshold = self.settings_dict['OPTIONS'].get('lock_wait_warning')
+        if threshold is not None and waited * 1000 >= threshold:
+            logger.warning(
+                'Ожидание блокировки записи %s: %.0f мс',
+                self.alias, waited * 1000,
+            )
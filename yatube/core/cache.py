@@ -0,0 +1,326 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL
+);
+CREATE TABLE IF NOT EXISTS cache_journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT
+);
+'''
+# Сколько ключей читать одним SELECT: предел параметров старых SQLite — 999
+CHUNK_SIZE = 500
+# Как часто, в записях процесса, проверять размер кэша
+CULL_EVERY = 100
+
+
+class SQLiteCache(BaseCache):
+    """Общий для всех процессов хоста кэш в файле SQLite.
+
+    Перед файлом стоит небольшой LRU-кэш процесса (L1). Каждая запись
+    добавляет строку в журнал изменений, номер строки служит версией.
+    Перед чтением из L1 процесс по PRAGMA data_version узнаёт, писал ли
+    кто-то в файл, и если да — выбрасывает из L1 ключи, изменённые после
+    последней прочитанной версии. Внешний сервис не нужен.
+
+    Параметры OPTIONS помимо стандартных: L1_MAX_ENTRIES — размер L1,
+    JOURNAL_LENGTH — сколько последних изменений хранить в журнале.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.location = location
+        self.l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self.journal_length = int(options.get('JOURNAL_LENGTH', 10000))
+        self.l1 = OrderedDict()
+        self.lock = threading.RLock()
+        self.local = threading.local()
+        self.seen = None
+        self.writes = 0
+
+    def connection(self):
+        """Своё соединение на поток; после fork открывается заново."""
+        conn = getattr(self.local, 'connection', None)
+        if conn is not None and self.local.pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self.location)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(
+            self.location, timeout=30, isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+        self.local.connection = conn
+        self.local.pid = os.getpid()
+        self.local.data_version = None
+        with self.lock:
+            if self.seen is None:
+                self.seen = self.last_seq(conn)
+        return conn
+
+    @staticmethod
+    def last_seq(conn):
+        return conn.execute(
+            'SELECT COALESCE(MAX(seq), 0) FROM cache_journal'
+        ).fetchone()[0]
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def sync(self, conn):
+        """Выбрасывает из L1 ключи, изменённые другими соединениями."""
+        data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self.local.data_version:
+            return
+        self.local.data_version = data_version
+        with self.lock:
+            rows = conn.execute(
+                'SELECT seq, key FROM cache_journal WHERE seq > ? '
+                'ORDER BY seq', (self.seen,)
+            ).fetchall()
+            if not rows:
+                return
+            # Журнал обрезан дальше прочитанного, или чужой clear()/чистка
+            if rows[0][0] > self.seen + 1 or any(
+                key is None for _, key in rows
+            ):
+                self.l1.clear()
+            else:
+                for _, key in rows:
+                    self.l1.pop(key, None)
+            self.seen = rows[-1][0]
+
+    def journal(self, conn, keys):
+        conn.executemany(
+            'INSERT INTO cache_journal (key) VALUES (?)',
+            [(key,) for key in keys],
+        )
+
+    def remember(self, key, value, expires):
+        self.l1[key] = (expires, value)
+        self.l1.move_to_end(key)
+        while len(self.l1) > self.l1_max_entries:
+            self.l1.popitem(last=False)
+
+    def read(self, keys):
+        """Сериализованные значения ключей: из L1, иначе из файла."""
+        conn = self.connection()
+        self.sync(conn)
+        now = time.time()
+        found = {}
+        missing = []
+        with self.lock:
+            token = self.seen
+            for key in keys:
+                entry = self.l1.get(key)
+                if entry is not None and (entry[0] is None or entry[0] > now):
+                    self.l1.move_to_end(key)
+                    found[key] = entry[1]
+                else:
+                    missing.append(key)
+        for start in range(0, len(missing), CHUNK_SIZE):
+            chunk = missing[start:start + CHUNK_SIZE]
+            rows = conn.execute(
+                'SELECT key, value, expires FROM cache_entries '
+                f'WHERE key IN ({", ".join("?" * len(chunk))})', chunk
+            ).fetchall()
+            with self.lock:
+                for key, value, expires in rows:
+                    if expires is not None and expires <= now:
+                        continue
+                    found[key] = value
+                    # Пока читали файл, другой поток мог выбросить ключ из L1
+                    if self.seen == token:
+                        self.remember(key, value, expires)
+        return found
+
+    def write(self, conn, items, expires):
+        rows = [
+            (key, pickle.dumps(value, self.pickle_protocol), expires)
+            for key, value in items
+        ]
+        conn.executemany(
+            'INSERT OR REPLACE INTO cache_entries (key, value, expires) '
+            'VALUES (?, ?, ?)', rows
+        )
+        self.journal(conn, [key for key, _, _ in rows])
+        return rows
+
+    def after_write(self, token, rows=(), forget=()):
+        """Обновляет L1 после коммита записи.
+
+        Если за это время другой поток прочитал журнал, запись могла уже
+        устареть: тогда значения в L1 не кладутся, только выбрасываются.
+        """
+        with self.lock:
+            for key in forget:
+                self.l1.pop(key, None)
+            for key, value, expires in rows:
+                if self.seen == token:
+                    self.remember(key, value, expires)
+                else:
+                    self.l1.pop(key, None)
+            self.writes += 1
+            check = self.writes % CULL_EVERY == 0
+        if check:
+            self.cull()
+
+    def cull(self):
+        with self.transaction() as conn:
+            conn.execute(
+                'DELETE FROM cache_entries WHERE expires <= ?', (time.time(),)
+            )
+            count = conn.execute(
+                'SELECT COUNT(*) FROM cache_entries'
+            ).fetchone()[0]
+            if count > self._max_entries:
+                conn.execute(
+                    'DELETE FROM cache_entries WHERE key IN ('
+                    'SELECT key FROM cache_entries '
+                    'ORDER BY expires IS NULL, expires LIMIT ?)',
+                    (count // self._cull_frequency or 1,)
+                )
+                self.journal(conn, [None])
+            conn.execute(
+                'DELETE FROM cache_journal WHERE seq <= ?',
+                (self.last_seq(conn) - self.journal_length,)
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        value = self.read([key]).get(key)
+        if value is None:
+            return default
+        return pickle.loads(value)
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_key(key, version=version): key for key in keys}
+        for key in keys:
+            self.validate_key(key)
+        return {
+            keys[key]: pickle.loads(value)
+            for key, value in self.read(list(keys)).items()
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        expires = self.get_backend_timeout(timeout)
+        token = self.seen
+        with self.transaction() as conn:
+            rows = self.write(conn, [(key, value)], expires)
+        self.after_write(token, rows)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        items = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            items.append((key, value))
+        expires = self.get_backend_timeout(timeout)
+        token = self.seen
+        with self.transaction() as conn:
+            rows = self.write(conn, items, expires)
+        self.after_write(token, rows)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        expires = self.get_backend_timeout(timeout)
+        token = self.seen
+        with self.transaction() as conn:
+            row = conn.execute(
+                'SELECT expires FROM cache_entries WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and (row[0] is None or row[0] > time.time()):
+                return False
+            rows = self.write(conn, [(key, value)], expires)
+        self.after_write(token, rows)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно: чтение и запись в одной IMMEDIATE-транзакции."""
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        token = self.seen
+        with self.transaction() as conn:
+            row = conn.execute(
+                'SELECT value, expires FROM cache_entries WHERE key = ?',
+                (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= time.time()):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            rows = self.write(conn, [(key, value)], row[1])
+        self.after_write(token, rows)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        expires = self.get_backend_timeout(timeout)
+        token = self.seen
+        with self.transaction() as conn:
+            touched = conn.execute(
+                'UPDATE cache_entries SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (expires, key, time.time())
+            ).rowcount
+            self.journal(conn, [key])
+        self.after_write(token, forget=[key])
+        return bool(touched)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        token = self.seen
+        with self.transaction() as conn:
+            conn.executemany(
+                'DELETE FROM cache_entries WHERE key = ?',
+                [(key,) for key in keys]
+            )
+            self.journal(conn, keys)
+        self.after_write(token, forget=keys)
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key in self.read([key])
+
+    def clear(self):
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM cache_entries')
+            self.journal(conn, [None])
+        with self.lock:
+            self.l1.clear()
@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.helpers import deserialize
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+from yatube.settings import THUMBNAIL_LRU_ENTRIES, THUMBNAIL_LRU_MAX_AGE
+
+# Так в кэше помечается ключ, которого нет и в базе: sorl считает пустое
+# значение отсутствующим, а повторного запроса к базе не будет
+MISSING = ''
+IMAGE_KEY = '||image||'
+# Счётчик удалений в общем кэше: по нему процессы сбрасывают свой LRU
+GENERATION_KEY = 'sorl_kvstore_generation'
+# Сколько ключей искать в базе одним запросом: в SQLite не больше 999
+# параметров
+CHUNK_SIZE = 500
+
+
+class KVStore(KVStoreBase):
+    """Хранилище метаданных sorl-thumbnail в общем кэше проекта.
+
+    Таблица sorl остаётся надёжной копией, но читается только при
+    промахе кэша, причём пачкой: preload() достаёт метаданные всех
+    картинок страницы двумя get_many. Перед кэшем стоит LRU процесса.
+    В нём живут только записи об отдельных файлах (identity image):
+    имя в хранилище по содержимому не меняет содержимого, и запись
+    о размере не устаревает, пока файл не удалён. Списки миниатюр
+    источника другие процессы дополняют, поэтому их всегда читают из
+    общего кэша.
+
+    Удаление (например, в reclaim_media) сдвигает счётчик в общем кэше.
+    Процесс сверяет его в начале каждого preload() и не реже раза в
+    THUMBNAIL_LRU_MAX_AGE секунд и, если счётчик сдвинулся, забывает
+    свой LRU: иначе долгоживущий процесс пула считал бы удалённые
+    миниатюры существующими.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = None
+        self.checked_at = None
+
+    @property
+    def cache(self):
+        return caches[settings.THUMBNAIL_CACHE]
+
+    def remember(self, key, value):
+        if IMAGE_KEY not in key or not THUMBNAIL_LRU_ENTRIES:
+            return
+        with self.lock:
+            self.local[key] = value
+            self.local.move_to_end(key)
+            while len(self.local) > THUMBNAIL_LRU_ENTRIES:
+                self.local.popitem(last=False)
+
+    def sync(self, force=False):
+        """Забывает LRU, если где-то удалили записи."""
+        now = time.monotonic()
+        if not force and self.checked_at is not None and (
+            now - self.checked_at < THUMBNAIL_LRU_MAX_AGE
+        ):
+            return
+        generation = self.cache.get(GENERATION_KEY)
+        with self.lock:
+            if generation != self.generation:
+                self.local.clear()
+                self.generation = generation
+            self.checked_at = now
+
+    def recall(self, key):
+        self.sync()
+        with self.lock:
+            value = self.local.get(key)
+            if value is not None:
+                self.local.move_to_end(key)
+            return value
+
+    def fetch(self, keys):
+        """Значения ключей: из кэша одним get_many, недостающие — одним
+        запросом к базе на CHUNK_SIZE ключей. Отсутствующие ключи в ответ
+        не попадают."""
+        found = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            rows = {}
+            for start in range(0, len(missing), CHUNK_SIZE):
+                rows.update(KVStoreModel.objects.filter(
+                    key__in=missing[start:start + CHUNK_SIZE]
+                ).values_list('key', 'value'))
+            self.cache.set_many(
+                {key: rows.get(key, MISSING) for key in missing},
+                settings.THUMBNAIL_CACHE_TIMEOUT,
+            )
+            found.update(rows)
+        values = {key: value for key, value in found.items() if value}
+        for key, value in values.items():
+            self.remember(key, value)
+        return values
+
+    def preload(self, names):
+        """Загружает метаданные картинок и всех их миниатюр, чтобы
+        следующие get_thumbnail по ним не обращались ни к кэшу, ни к
+        базе, ни к хранилищу."""
+        self.sync(force=True)
+        sources = [ImageFile(name).key for name in names]
+        lists = self.fetch([
+            add_prefix(key, 'thumbnails') for key in sources
+        ] + [
+            add_prefix(key) for key in sources
+            if self.recall(add_prefix(key)) is None
+        ])
+        thumbnails = set()
+        for key in sources:
+            listed = lists.get(add_prefix(key, 'thumbnails'))
+            if listed:
+                thumbnails.update(map(add_prefix, deserialize(listed)))
+        self.fetch([key for key in thumbnails if self.recall(key) is None])
+
+    def clear(self, delete_thumbnails=False):
+        prefix = settings.THUMBNAIL_KEY_PREFIX
+        keys = list(self._find_keys_raw(prefix))
+        if delete_thumbnails:
+            self.delete_all_thumbnail_files()
+        self._delete_raw(*keys)
+
+    def _get_raw(self, key):
+        value = self.recall(key)
+        if value is None:
+            value = self.fetch([key]).get(key)
+        return value
+
+    def _set_raw(self, key, value):
+        KVStoreModel.objects.update_or_create(
+            key=key, defaults={'value': value}
+        )
+        self.cache.set(key, value, settings.THUMBNAIL_CACHE_TIMEOUT)
+        self.remember(key, value)
+
+    def _delete_raw(self, *keys):
+        KVStoreModel.objects.filter(key__in=keys).delete()
+        self.cache.delete_many(keys)
+        self.cache.add(GENERATION_KEY, 0, None)
+        try:
+            self.cache.incr(GENERATION_KEY)
+        except ValueError:
+            # Счётчик вытеснили между add и incr: его отсутствие тоже
+            # сбросит LRU других процессов
+            pass
+        with self.lock:
+            for key in keys:
+                self.local.pop(key, None)
+
+    def _find_keys_raw(self, prefix):
+        return KVStoreModel.objects.filter(
+            key__startswith=prefix
+        ).values_list('key', flat=True)
@@ -0,0 +1,105 @@
+"""Чтение с реплик для страниц, которые только читают.
+
+Представление, обёрнутое в replica_reads, читает с одной из реплик
+DATABASE_REPLICAS; всё остальное, включая любые записи, идёт в default.
+Пользователь, который только что писал (sticks_to_primary), получает
+cookie и REPLICA_MAX_LAG секунд читает с default: свои посты, лайки и
+комментарии он видит сразу, даже если реплика отстаёт.
+"""
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.db import DEFAULT_DB_ALIAS
+from yatube.settings import DATABASE_REPLICAS, REPLICA_MAX_LAG
+
+PRIMARY_COOKIE = 'read_primary'
+
+_state = threading.local()
+
+
+def reading_replica():
+    return getattr(_state, 'replica', None)
+
+
+@contextmanager
+def use_replica():
+    """Чтения внутри блока идут на реплику, одну на весь блок."""
+    previous = reading_replica()
+    _state.replica = (
+        random.choice(DATABASE_REPLICAS) if DATABASE_REPLICAS else None
+    )
+    try:
+        yield _state.replica
+    finally:
+        _state.replica = previous
+
+
+def cache_key(key):
+    """Ключ кэша для того, что нарисовано по прочитанным данным.
+
+    Реплика может ещё не видеть записи, ради которой сдвинулась версия
+    в ключе. Нарисованное по ней хранится под своим ключом, чтобы автор
+    записи, читающий с default, его не получил, и живёт не дольше
+    отставания реплики (cache_timeout).
+    """
+    replica = reading_replica()
+    return f'{key}:{replica}' if replica else key
+
+
+def cache_timeout(timeout):
+    if reading_replica():
+        return min(timeout, REPLICA_MAX_LAG)
+    return timeout
+
+
+def load_user(request):
+    """Сессия и пользователь читаются с default: на реплике только что
+    вошедшего пользователя может ещё не быть."""
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_authenticated
+
+
+def replica_reads(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (
+            request.method not in ('GET', 'HEAD')
+            or PRIMARY_COOKIE in request.COOKIES
+        ):
+            return view(request, *args, **kwargs)
+        load_user(request)
+        with use_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def sticks_to_primary(view):
+    """Для представлений, которые пишут: после них зритель читает с
+    default, пока реплики догоняют."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if DATABASE_REPLICAS and response.status_code < 400:
+            response.set_cookie(
+                PRIMARY_COOKIE, '1', max_age=REPLICA_MAX_LAG,
+                httponly=True, samesite='Lax',
+            )
+        return response
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return reading_replica()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии default: объекты с любой из них связываемы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in DATABASE_REPLICAS
@@ -0,0 +1,69 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_NAME = 'sha256'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла — хэш его содержимого.
+
+    Хэш считается на лету, пока загрузка копируется во временный файл
+    рядом с целевым, так что содержимое читается один раз. Одинаковые
+    файлы получают одно имя: повторная загрузка не занимает места, а
+    миниатюры, построенные по имени, достаются всем дубликатам.
+    Каталог из upload_to сохраняется: posts/ab/abcdef….jpg.
+    """
+
+    def content_name(self, directory, digest, extension):
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определит содержимое, а совпадение имён и есть дубликат
+        return name
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        full_directory = self.path(directory)
+        os.makedirs(full_directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=full_directory, suffix='.upload'
+        )
+        try:
+            digest = hashlib.new(HASH_NAME)
+            with os.fdopen(descriptor, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            name = self.content_name(
+                directory, digest.hexdigest(), extension
+            )
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name.replace('\\', '/')
+
+    def hash_file(self, name, directory):
+        """Имя, под которым уже лежащий файл хранился бы в directory."""
+        digest = hashlib.new(HASH_NAME)
+        with self.open(name) as file:
+            for chunk in file.chunks():
+                digest.update(chunk)
+        extension = os.path.splitext(name)[1].lower()
+        return self.content_name(
+            directory, digest.hexdigest(), extension
+        ).replace('\\', '/')
@@ -0,0 +1,105 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+from core.cache import SQLiteCache
+
+
+def make_cache(location, **options):
+    return SQLiteCache(location, {'OPTIONS': options})
+
+
+def increment(location, times):
+    cache = make_cache(location)
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = make_cache(self.location)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_basic_operations(self):
+        """Основные операции ведут себя как у встроенных бэкендов."""
+        cache = self.cache
+        self.assertIsNone(cache.get('missing'))
+        cache.set('key', {'value': [1, 2]})
+        self.assertEqual(cache.get('key'), {'value': [1, 2]})
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertTrue(cache.add('new', 'value'))
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(
+            cache.get_many(['a', 'b', 'missing']), {'a': 1, 'b': 2}
+        )
+        self.assertEqual(cache.incr('a', 10), 11)
+        self.assertEqual(cache.decr('a'), 10)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        cache.delete('key')
+        self.assertFalse(cache.has_key('key'))
+        cache.clear()
+        self.assertIsNone(cache.get('new'))
+
+    def test_expiry(self):
+        self.cache.set('short', 'value', 0.05)
+        self.cache.set('forever', 'value', None)
+        self.assertTrue(self.cache.touch('forever', 0.05))
+        self.assertFalse(self.cache.touch('missing'))
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertIsNone(self.cache.get('forever'))
+
+    def test_l1_invalidated_by_other_process(self):
+        """Запись другого процесса выбрасывает ключ из L1 этого."""
+        other = make_cache(self.location)
+        self.cache.set('key', 'old')
+        self.assertEqual(other.get('key'), 'old')
+        self.assertIn(':1:key', other.l1)
+        self.cache.set('key', 'new')
+        self.assertEqual(other.get('key'), 'new')
+        self.cache.delete('key')
+        self.assertIsNone(other.get('key'))
+        other.set('key', 'again')
+        self.cache.clear()
+        self.assertIsNone(other.get('key'))
+
+    def test_cull_keeps_entries_without_expiry(self):
+        cache = make_cache(self.location, MAX_ENTRIES=10, CULL_FREQUENCY=2)
+        cache.set('version', 1, None)
+        for i in range(200):
+            cache.set(f'key{i}', i)
+        self.assertEqual(cache.get('version'), 1)
+        self.assertLess(len(cache.get_many(
+            [f'key{i}' for i in range(200)]
+        )), 200)
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_tests_do_not_use_server_cache(self):
+        """Тесты работают со своим кэшем, а не с общим файлом сервера."""
+        self.assertNotIsInstance(caches['default'], SQLiteCache)
+        # Окружение наследуют процессы, запущенные из тестов
+        self.assertEqual(
+            os.environ['DJANGO_SETTINGS_MODULE'], 'yatube.settings_test'
+        )
@@ -0,0 +1,85 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from sorl.thumbnail.images import ImageFile
+from yatube.settings import THUMBNAIL_LRU_MAX_AGE
+
+from core.kvstore import KVStore
+
+SOURCES = ('posts/ab/first.jpg', 'posts/cd/second.jpg')
+WIDTHS = (320, 640)
+
+
+def image_file(name, size):
+    image = ImageFile(name)
+    image.set_size(size)
+    return image
+
+
+class KVStoreTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        writer = KVStore()
+        self.thumbnails = []
+        for name in SOURCES:
+            source = image_file(name, (800, 400))
+            writer.set(source)
+            for width in WIDTHS:
+                thumbnail = image_file(
+                    f'cache/{width}-{name}', (width, width // 2)
+                )
+                writer.set(thumbnail, source)
+                self.thumbnails.append(thumbnail)
+        self.store = KVStore()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_preload_reads_page_in_bulk(self):
+        """preload достаёт метаданные страницы пачкой, и чтения по ним не
+        обращаются ни к кэшу, ни к базе."""
+        cache.clear()
+        with self.assertNumQueries(2):
+            self.store.preload(SOURCES)
+        with self.assertNumQueries(0), \
+                mock.patch.object(cache, 'get_many') as get_many:
+            for thumbnail in self.thumbnails:
+                self.assertEqual(
+                    self.store.get(thumbnail).size, thumbnail.size
+                )
+        get_many.assert_not_called()
+
+    def test_missing_key_is_cached(self):
+        """Отсутствие записи запоминается в кэше: база читается один раз."""
+        missing = ImageFile('cache/missing.jpg')
+        with self.assertNumQueries(1):
+            self.assertIsNone(self.store.get(missing))
+            self.assertIsNone(self.store.get(missing))
+
+    def test_delete_forgets_thumbnails(self):
+        """Удалённые записи пропадают и из LRU процесса, и из кэша."""
+        self.store.preload(SOURCES)
+        source = ImageFile(SOURCES[0])
+        with mock.patch.object(ImageFile, 'delete'):
+            self.store.delete(source)
+        self.assertIsNone(self.store.get(source))
+        self.assertIsNone(KVStore().get(self.thumbnails[0]))
+        self.assertIsNotNone(KVStore().get(self.thumbnails[-1]))
+
+    def test_delete_elsewhere_resets_process_lru(self):
+        """Удаление в другом процессе сбрасывает LRU: при следующем
+        preload или по истечении срока удалённая миниатюра не считается
+        существующей."""
+        worker = KVStore()
+        worker.preload(SOURCES)
+        self.store.preload(SOURCES)
+        with mock.patch.object(ImageFile, 'delete'):
+            KVStore().delete(ImageFile(SOURCES[0]))
+        worker.preload(SOURCES)
+        self.assertIsNone(worker.get(self.thumbnails[0]))
+        self.assertIsNotNone(worker.get(self.thumbnails[-1]))
+        later = time.monotonic() + THUMBNAIL_LRU_MAX_AGE + 1
+        with mock.patch('core.kvstore.time.monotonic', return_value=later):
+            self.assertIsNone(self.store.get(self.thumbnails[0]))
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from django.test import SimpleTestCase
+
+from core.backends.sqlite3.base import DatabaseWrapper, lock_waits
+
+OPTIONS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -2048,
+    'mmap_size': 1024 * 1024,
+    'busy_timeout': 2000,
+    'lock_wait_warning': 50,
+}
+
+
+def make_wrapper(name, alias):
+    return DatabaseWrapper({
+        'NAME': name, 'OPTIONS': dict(OPTIONS), 'CONN_MAX_AGE': 0,
+        'AUTOCOMMIT': True, 'ATOMIC_REQUESTS': False, 'TIME_ZONE': None,
+        'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '', 'TEST': {},
+    }, alias)
+
+
+class SQLiteBackendTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.name = os.path.join(self.directory, 'db.sqlite3')
+        self.wrappers = []
+
+    def tearDown(self):
+        for wrapper in self.wrappers:
+            wrapper.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def wrapper(self, alias):
+        wrapper = make_wrapper(self.name, alias)
+        self.wrappers.append(wrapper)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        """PRAGMA из OPTIONS выставляются каждому новому соединению."""
+        wrapper = self.wrapper('first')
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+        self.assertEqual(self.pragma(wrapper, 'cache_size'), -2048)
+        self.assertEqual(self.pragma(wrapper, 'mmap_size'), 1024 * 1024)
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 2000)
+
+    def test_lock_wait_is_reported(self):
+        """Транзакция ждёт чужую запись и сообщает, сколько ждала."""
+        writer = self.wrapper('writer')
+        waiter = self.wrapper('waiter')
+        writer.ensure_connection()
+        writer.connection.execute('BEGIN IMMEDIATE')
+        release = threading.Timer(
+            0.2, lambda: writer.connection.execute('ROLLBACK')
+        )
+        transactions, seconds = lock_waits.snapshot()
+        release.start()
+        with self.assertLogs('core.backends.sqlite3.base', 'WARNING'):
+            waiter._start_transaction_under_autocommit()
+        release.join()
+        waiter.connection.execute('ROLLBACK')
+        now_transactions, now_seconds = lock_waits.snapshot()
+        self.assertEqual(now_transactions, transactions + 1)
+        self.assertGreaterEqual(now_seconds - seconds, 0.15)
@@ -0,0 +1,52 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.storage = ContentAddressedStorage(location=self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_name_is_content_hash(self):
+        """Имя файла — хэш содержимого в каталоге upload_to."""
+        content = b'picture' * 10000
+        name = self.storage.save('posts/Photo.JPG', ContentFile(content))
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(name, f'posts/{digest[:2]}/{digest}.jpg')
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), content)
+
+    def test_duplicates_share_file(self):
+        """Одинаковые загрузки занимают один файл, разные — разные."""
+        first = self.storage.save('posts/a.png', ContentFile(b'same'))
+        second = self.storage.save('posts/b.png', ContentFile(b'same'))
+        other = self.storage.save('posts/c.png', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        files = [
+            filename
+            for _, _, filenames in os.walk(self.directory)
+            for filename in filenames
+        ]
+        self.assertEqual(len(files), 2)
+
+    def test_hash_file(self):
+        """Для уже лежащего файла вычисляется его имя по содержимому."""
+        legacy = os.path.join(self.directory, 'posts', 'old.png')
+        os.makedirs(os.path.dirname(legacy))
+        with open(legacy, 'wb') as file:
+            file.write(b'legacy')
+        saved = self.storage.save('posts/new.png', ContentFile(b'legacy'))
+        self.assertEqual(
+            self.storage.hash_file('posts/old.png', 'posts'), saved
+        )
@@ -0,0 +1,27 @@
+from django.core.files.uploadhandler import (StopUpload,
+                                             TemporaryFileUploadHandler)
+from yatube.settings import UPLOAD_MAX_BYTES
+
+TOO_LARGE = 'Файл слишком велик: не больше {} МБ.'
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку на диск по частям и обрывает её, как только она
+    превысила UPLOAD_MAX_BYTES: в памяти не бывает больше одной части."""
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > UPLOAD_MAX_BYTES:
+            self.file.close()
+            self.request.upload_too_large = True
+            raise StopUpload(connection_reset=False)
+        return super().receive_data_chunk(raw_data, start)
+
+
+def reject_too_large(request, form, field='image'):
+    """Добавляет форме ошибку, если загрузка была оборвана: без неё форма
+    увидела бы пустое поле и приняла бы пост без картинки."""
+    if form.is_bound and getattr(request, 'upload_too_large', False):
+        form.full_clean()
+        form.add_error(
+            field, TOO_LARGE.format(UPLOAD_MAX_BYTES // (1024 * 1024))
+        )
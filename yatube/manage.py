@@ -3,6 +3,10 @@ import sys
 
 
 def main():
+    # Тесты идут со своими настройками. Модуль передаётся через окружение,
+    # чтобы его получили и процессы, запущенные из тестов
+    if sys.argv[1:2] == ['test']:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings_test')
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
     try:
         from django.core.management import execute_from_command_line
@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db import connections, router
+from django.db.models.signals import post_migrate
+
+
+def reinstall_fts_triggers(sender, using, **kwargs):
+    """Возвращает триггеры FTS5, потерянные при пересборке posts_post."""
+    from .models import Post
+    from .search import install_fts_triggers
+    if router.allow_migrate_model(using, Post):
+        install_fts_triggers(connections[using])
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
     verbose_name = 'Публикация записей'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(reinstall_fts_triggers, sender=self)
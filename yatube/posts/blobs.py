@@ -0,0 +1,42 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import F
+
+from .models import ImageBlob
+
+
+def file_size(image):
+    try:
+        return image.size
+    except (OSError, SuspiciousFileOperation):
+        return 0
+
+
+def retain(name, size=0):
+    """Ещё один пост ссылается на файл картинки."""
+    if not name:
+        return
+    ImageBlob.objects.get_or_create(name=name, defaults={'size': size})
+    ImageBlob.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def release(name):
+    """Пост больше не ссылается на файл. Файл без ссылок не удаляется
+    сразу: одинаковая картинка может как раз загружаться заново."""
+    if not name:
+        return
+    ImageBlob.objects.filter(name=name, refs__gt=0).update(
+        refs=F('refs') - 1
+    )
+
+
+def track(post, created):
+    """Переносит ссылку сохранённого поста с прежней картинки на новую."""
+    replaced = post._initial_image is not None and (
+        post.image.name != post._initial_image
+    )
+    if (created or replaced) and post.image:
+        retain(post.image.name, file_size(post.image))
+    if replaced and not created:
+        release(post._initial_image)
+    if 'image' in post.__dict__:
+        post._initial_image = post.image.name
@@ -0,0 +1,292 @@
+import hashlib
+import math
+import random
+import time
+import uuid
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from core.routers import cache_key, cache_timeout
+from yatube.settings import (FRAGMENT_CACHE_TIMEOUT, PAGE_CACHE_TIMEOUT,
+                             SINGLE_FLIGHT_BETA, SINGLE_FLIGHT_LEASE,
+                             SINGLE_FLIGHT_STALE)
+
+VERSION_PREFIX = 'version:'
+CARD_PREFIX = 'post_card:'
+PAGE_PREFIX = 'page:'
+LOCK_PREFIX = 'lock:'
+# Как часто ждущий процесс проверяет, готово ли значение, секунды
+LOCK_POLL_INTERVAL = 0.02
+# Общая версия для редких событий, меняющих все ленты сразу:
+# переименование группы или автора
+SITE = 'site'
+INDEX = 'index'
+POPULAR = 'popular'
+
+
+def group_feed(slug):
+    return f'group:{slug}'
+
+
+def profile_feed(username):
+    return f'profile:{username}'
+
+
+def post_version(post_id):
+    return f'post:{post_id}'
+
+
+def post_versions(post, group_slug=None):
+    """Версии, которые меняются вместе с постом: карточка и его ленты."""
+    names = [
+        post_version(post.id), INDEX, POPULAR,
+        profile_feed(post.author.username),
+    ]
+    if post.group_id:
+        names.append(group_feed(post.group.slug))
+    if group_slug:
+        names.append(group_feed(group_slug))
+    return names
+
+
+_last_version = 0
+
+
+def new_version():
+    """Версия — время изменения в наносекундах, строго возрастающее в
+    процессе. Счётчик, вытесненный из кэша, не вернётся к уже занятому
+    значению, а по версиям страницы виден момент её изменения."""
+    global _last_version
+    _last_version = max(time.time_ns(), _last_version + 1)
+    return _last_version
+
+
+def get_versions(names):
+    keys = [VERSION_PREFIX + name for name in names]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        cache.add(key, new_version(), None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return [versions.get(key) for key in keys]
+
+
+def bump(*names):
+    """Сдвигает версии лент: закэшированные фрагменты перестают совпадать."""
+    version = new_version()
+    cache.set_many(
+        {VERSION_PREFIX + name: version for name in set(names)}, None
+    )
+
+
+def depends_on(request, *names):
+    """Запоминает версии, от которых зависит ответ, и возвращает их.
+
+    Вызывается до чтения данных из базы: правка, случившаяся во время
+    отрисовки, сдвинет версию, и закэшированный ответ сразу устареет.
+    """
+    versions = get_versions(names)
+    dependencies = getattr(request, 'cache_dependencies', None)
+    if dependencies is not None:
+        dependencies.update(zip(names, versions))
+    return versions
+
+
+def feed_fragment(request, *names):
+    """Контекст для {% cache %} вокруг ленты.
+
+    Ключ складывается из версий лент, страницы и курсора. От зрителя
+    фрагмент не зависит: его лайки вставляются после чтения из кэша.
+    """
+    parts = depends_on(request, SITE, *names) + [
+        request.GET.get('page'), request.GET.get('cursor')
+    ]
+    return {
+        'fragment_key': cache_key(':'.join(str(part) for part in parts)),
+        'fragment_timeout': cache_timeout(FRAGMENT_CACHE_TIMEOUT),
+    }
+
+
+def cached_cards(posts):
+    """Ключи карточек постов и уже готовый HTML — одним чтением кэша.
+
+    Ключ — id поста, его версия и версия сайта; для отсутствующих
+    в кэше карточек вместо HTML стоит None.
+    """
+    posts = list(posts)
+    site, *versions = get_versions(
+        [SITE] + [post_version(post.id) for post in posts]
+    )
+    keys = {
+        post.id: cache_key(f'{CARD_PREFIX}{post.id}:{version}:{site}')
+        for post, version in zip(posts, versions)
+    }
+    found = cache.get_many(list(keys.values()))
+    return {post_id: (key, found.get(key)) for post_id, key in keys.items()}
+
+
+def single_flight(key, compute, timeout, is_fresh=None,
+                  lease=SINGLE_FLIGHT_LEASE, beta=SINGLE_FLIGHT_BETA):
+    """Значение из кэша, которое пересчитывает один процесс за раз.
+
+    Устаревшее значение (истёк timeout или is_fresh вернул False)
+    пересчитывает только тот, кто взял блокировку; остальные до конца
+    пересчёта получают прежнее значение, а если его нет — ждут, пока
+    блокировка не освободится. Блокировка — ключ с арендой на lease
+    секунд, так что упавший процесс не задержит остальных надолго.
+    Незадолго до истечения значение пересчитывается заранее, с
+    вероятностью тем большей, чем ближе срок и дольше сам пересчёт.
+    Значение None не кэшируется.
+    """
+    key = cache_key(key)
+    envelope = cache.get(key)
+    if usable(envelope, is_fresh, beta):
+        return envelope['value']
+    lock = LOCK_PREFIX + key
+    token = uuid.uuid4().hex
+    if not cache.add(lock, token, lease):
+        if envelope is not None:
+            return envelope['value']
+        envelope = wait_for(key, lock, lease)
+        if envelope is not None:
+            return envelope['value']
+        cache.add(lock, token, lease)
+    try:
+        # Пока брали блокировку, пересчёт мог закончить другой процесс
+        latest = cache.get(key)
+        if replaced(envelope, latest) and usable(latest, is_fresh, 0):
+            return latest['value']
+        started = time.time()
+        value = compute()
+        finished = time.time()
+        if value is not None:
+            timeout = cache_timeout(timeout)
+            cache.set(key, {
+                'value': value,
+                'delta': finished - started,
+                'expires': finished + timeout,
+            }, timeout + SINGLE_FLIGHT_STALE)
+    finally:
+        if cache.get(lock) == token:
+            cache.delete(lock)
+    return value
+
+
+def usable(envelope, is_fresh, beta):
+    if envelope is None:
+        return False
+    if is_fresh is not None and not is_fresh(envelope['value']):
+        return False
+    # Досрочный пересчёт: -log(u) ≥ 0 и в среднем равно 1
+    margin = -envelope['delta'] * beta * math.log(1 - random.random())
+    return time.time() + margin < envelope['expires']
+
+
+def replaced(envelope, latest):
+    if latest is None:
+        return False
+    return envelope is None or latest['expires'] != envelope['expires']
+
+
+def wait_for(key, lock, lease):
+    """Ждёт чужого пересчёта, пока держится блокировка, но не дольше lease."""
+    deadline = time.time() + lease
+    while time.time() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        envelope = cache.get(key)
+        if envelope is not None:
+            return envelope
+        if cache.get(lock) is None:
+            return None
+    return None
+
+
+def is_anonymous(request):
+    """Без cookie сессии: ответ не зависит от зрителя, а сессия и
+    пользователь не читаются из базы."""
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+
+def page_key(request):
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    path = f'{request.path}?{query}'.encode()
+    return PAGE_PREFIX + hashlib.md5(path).hexdigest()
+
+
+def is_fresh_page(entry):
+    versions = entry['versions']
+    return get_versions(list(versions)) == list(versions.values())
+
+
+def entry_header(entry, name):
+    return dict(entry['headers'])[name]
+
+
+def page_response(entry):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for header, value in entry['headers']:
+        response[header] = value
+    return response
+
+
+def anonymous_page(view):
+    """Кэширует страницу целиком для анонимных читателей.
+
+    Запись хранит версии лент, от которых зависела страница (их
+    объявляет представление через depends_on), и действительна, пока
+    они не сдвинулись. Проверка — одно чтение версий из кэша, так что
+    повторный запрос и ответ 304 по If-None-Match/If-Modified-Since
+    обходятся без базы. ETag — хэш тела, Last-Modified — самая свежая
+    из версий. Устаревшую страницу перерисовывает один процесс, прочие
+    читатели тем временем получают её прежнюю версию.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not is_anonymous(request):
+            return view(request, *args, **kwargs)
+        rendered = {}
+
+        def render():
+            request.cache_dependencies = {}
+            depends_on(request, SITE)
+            response = view(request, *args, **kwargs)
+            rendered['response'] = response
+            if (
+                response.status_code != 200 or response.cookies
+                or response.streaming or request.META.get('CSRF_COOKIE_USED')
+            ):
+                return None
+            versions = request.cache_dependencies
+            response['ETag'] = '"%s"' % hashlib.md5(
+                response.content
+            ).hexdigest()
+            response['Last-Modified'] = http_date(
+                max(versions.values()) // 10 ** 9
+            )
+            patch_vary_headers(response, ('Cookie',))
+            return {
+                'versions': versions,
+                'content': response.content,
+                'status': response.status_code,
+                'headers': list(response.items()),
+            }
+
+        entry = single_flight(
+            page_key(request), render, PAGE_CACHE_TIMEOUT,
+            is_fresh=is_fresh_page,
+        )
+        if entry is None:
+            return rendered['response']
+        return get_conditional_response(
+            request,
+            etag=entry_header(entry, 'ETag'),
+            last_modified=max(entry['versions'].values()) // 10 ** 9,
+            response=page_response(entry),
+        )
+    return wrapper
@@ -0,0 +1,182 @@
+import heapq
+from itertools import islice
+
+from django.db import connections, router
+from django.db.models import F
+from yatube.settings import (FEED_CELEBRITY_THRESHOLD, NUM_OF_POSTS_ON_PAGE,
+                             TIMELINE_MAX_LENGTH)
+
+from .models import Follow, FollowerCount, Post, TimelineEntry
+from .utils import CursorPaginator
+
+# Читателей в одной команде обрезки лент
+TRIM_BATCH_SIZE = 500
+
+
+def is_celebrity(author_id):
+    """Посты автора с большим числом подписчиков читаются при запросе."""
+    return FollowerCount.objects.filter(
+        author_id=author_id, count__gte=FEED_CELEBRITY_THRESHOLD
+    ).exists()
+
+
+def celebrity_ids(user):
+    """Авторы из подписок читателя, чьи посты не раскладываются по лентам."""
+    return list(FollowerCount.objects.filter(
+        author__following__user=user,
+        count__gte=FEED_CELEBRITY_THRESHOLD,
+    ).values_list('author_id', flat=True))
+
+
+def change_follower_count(author, delta):
+    """Меняет счётчик подписчиков автора.
+
+    Отписка строку не создаёт: при удалении автора каскад мог уже убрать
+    его счётчик, и новая строка с нулём ушла бы в минус.
+    """
+    counts = FollowerCount.objects.filter(author=author)
+    if delta > 0:
+        FollowerCount.objects.get_or_create(author=author)
+    else:
+        counts = counts.filter(count__gte=-delta)
+    counts.update(count=F('count') + delta)
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    Возвращает число записанных строк; посты «звёзд» не раскладываются.
+    """
+    if is_celebrity(post.author_id):
+        return 0
+    follower_ids = list(Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True))
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post.id,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in follower_ids
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    trim_timelines(follower_ids)
+    return len(follower_ids)
+
+
+def backfill_timeline(user, author):
+    """Добавляет в ленту читателя последние посты нового автора."""
+    if is_celebrity(author.id):
+        return
+    posts = Post.objects.filter(author=author).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:TIMELINE_MAX_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                user_id=user.id,
+                post_id=post_id,
+                author_id=author.id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in posts
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    trim_timelines([user.id])
+
+
+def prune_timeline(user, author):
+    """Убирает из ленты читателя посты автора, от которого он отписался."""
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+
+
+def trim_timelines(user_ids):
+    """Обрезает ленты до TIMELINE_MAX_LENGTH самых свежих записей.
+
+    Лишние записи находит оконная функция: одна команда DELETE на пачку
+    читателей, а не запрос границы и удаление на каждого.
+    """
+    table = TimelineEntry._meta.db_table
+    user_ids = list(user_ids)
+    with connections[router.db_for_write(TimelineEntry)].cursor() as cursor:
+        for start in range(0, len(user_ids), TRIM_BATCH_SIZE):
+            batch = user_ids[start:start + TRIM_BATCH_SIZE]
+            cursor.execute(
+                f'DELETE FROM {table} WHERE id IN ('
+                f'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+                f'PARTITION BY user_id ORDER BY pub_date DESC, post_id DESC'
+                f') AS position FROM {table} '
+                f'WHERE user_id IN ({", ".join(["%s"] * len(batch))})'
+                f') AS ranked WHERE position > %s)',
+                batch + [TIMELINE_MAX_LENGTH],
+            )
+
+
+def sync_pub_date(post):
+    """Переносит изменённую дату публикации в уже разложенные записи."""
+    TimelineEntry.objects.filter(post=post).exclude(
+        pub_date=post.pub_date
+    ).update(pub_date=post.pub_date)
+
+
+class FollowFeedPaginator(CursorPaginator):
+    """Лента подписок, собранная из двух источников.
+
+    Посты обычных авторов берутся из материализованной ленты читателя,
+    посты «звёзд» — отдельным диапазоном по каждому такому автору.
+    Источники сливаются k-путевым слиянием через кучу по (pub_date, id).
+    """
+
+    def __init__(self, user, per_page):
+        self.user = user
+        self.celebrities = celebrity_ids(user)
+        super().__init__(Post.objects.none(), per_page)
+
+    def fetch(self, values, backwards, offset, limit):
+        needed = offset + limit
+        entries = TimelineEntry.objects.filter(
+            user=self.user
+        ).select_related('post__author', 'post__group')
+        pushed = [
+            entry.post for entry in self.slice_of(
+                entries, ('pub_date', 'post_id'), values, backwards, 0, needed
+            )
+        ]
+        streams = [pushed]
+        for author_id in self.celebrities:
+            posts = Post.objects.filter(
+                author_id=author_id
+            ).select_related('author', 'group')
+            streams.append(self.slice_of(
+                posts, ('pub_date', 'id'), values, backwards, 0, needed
+            ))
+        merged = heapq.merge(
+            *streams,
+            key=lambda post: (post.pub_date, post.id),
+            reverse=self.descending != backwards,
+        )
+        return list(islice(unique_posts(merged), offset, needed))
+
+
+def unique_posts(posts):
+    """Пост мог попасть в ленту до того, как автор стал «звездой»."""
+    seen = set()
+    for post in posts:
+        if post.id not in seen:
+            seen.add(post.id)
+            yield post
+
+
+def follow_feed(user, request):
+    """Страница ленты подписок без join по Follow на каждый запрос."""
+    paginator = FollowFeedPaginator(user, NUM_OF_POSTS_ON_PAGE)
+    return paginator.get_page(
+        request.GET.get('page'), request.GET.get('cursor')
+    )
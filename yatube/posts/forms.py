@@ -1,13 +1,42 @@
 from django import forms
 
 from .models import Comment, Group, Post
+from .uploads import ImageRejected, check_header
 
 
 class PostForm(forms.ModelForm):
+    # Сведения о картинке, которые меняются вместе с полем image
+    IMAGE_FIELDS = (
+        'image_width', 'image_height', 'image_portrait', 'image_processed'
+    )
+
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        """Только заголовок: пиксели декодирует пул после сохранения."""
+        image = self.cleaned_data.get('image')
+        header = getattr(image, 'image', None)
+        if header is not None:
+            try:
+                check_header(header)
+            except ImageRejected as error:
+                raise forms.ValidationError(str(error))
+        return image
+
+    def save(self, commit=True):
+        if 'image' in self.changed_data and self.cleaned_data.get('image'):
+            # Пока пул не очистил файл, варианты по нему не строятся
+            self.instance.image_processed = False
+        return super().save(commit)
+
+    def edited_fields(self):
+        """Поля, которые пишет правка поста. Счётчики лайков и
+        комментариев в это время меняются через F(), и сохранение всей
+        строки, прочитанной в начале запроса, затёрло бы их."""
+        return list(self._meta.fields) + list(self.IMAGE_FIELDS)
+
 class GroupForm(forms.ModelForm):
     class Meta:
         model = Group
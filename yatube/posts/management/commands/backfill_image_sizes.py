@@ -0,0 +1,61 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import caching
+from posts.models import Post
+
+SIZE_FIELDS = ('image_width', 'image_height', 'image_portrait')
+
+
+class Command(BaseCommand):
+    help = (
+        'Записывает размеры и ориентацию картинок постов, загруженных до '
+        'появления этих полей. Новые посты получают их при загрузке.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=200,
+            help='Сколько постов обрабатывать в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(options['chunk_size'], 1)
+        posts = Post.objects.exclude(image='').filter(
+            image_width__isnull=True
+        ).order_by('id').only('id', 'image', *SIZE_FIELDS)
+        last_id = 0
+        updated = 0
+        unreadable = 0
+        while True:
+            chunk = list(posts.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            measured = []
+            for post in chunk:
+                try:
+                    post.image_width = post.image.width
+                    post.image_height = post.image.height
+                except (OSError, SuspiciousFileOperation):
+                    post.image_width = None
+                finally:
+                    post.image.close()
+                if not post.image_width:
+                    unreadable += 1
+                    continue
+                post.update_orientation()
+                measured.append(post)
+            with transaction.atomic():
+                Post.objects.bulk_update(measured, SIZE_FIELDS)
+            updated += len(measured)
+        if updated:
+            # Карточки, нарисованные без размеров, перерисуются
+            caching.bump(caching.SITE)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записаны размеры картинок: {updated}, не удалось прочитать: '
+            f'{unreadable}.'
+        ))
@@ -0,0 +1,51 @@
+from concurrent.futures import wait
+
+from django.core.management.base import BaseCommand
+
+from posts import caching, thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит в пуле процессов варианты картинок постов, у которых их '
+        'нет, — например, загруженных до появления вариантов. Новые '
+        'загрузки получают варианты сами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=100,
+            help='Сколько постов отдавать пулу за раз.',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(options['chunk_size'], 1)
+        posts = Post.objects.exclude(image='').order_by('id').select_related(
+            'author', 'group'
+        ).prefetch_related('image_variants')
+        last_id = 0
+        submitted = 0
+        failed = 0
+        while True:
+            chunk = list(posts.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            futures = []
+            for post in chunk:
+                if thumbnails.ready_variants(post) is not None:
+                    continue
+                future = thumbnails.submit(
+                    post.id, post.image.name, caching.post_versions(post)
+                )
+                if future is not None:
+                    futures.append(future)
+            wait(futures)
+            submitted += len(futures)
+            failed += sum(1 for future in futures if future.exception())
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок отдано пулу: {submitted}, с ошибкой: {failed}.'
+        ))
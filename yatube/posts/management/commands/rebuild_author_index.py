@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import AuthorSearchTerm, User
+from posts.search import index_authors
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет индекс поиска авторов по существующим пользователям. '
+        'Дальше индекс обновляется при регистрации и смене профиля.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Предварительно удалить все термы индекса.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Сколько пользователей обрабатывать в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(options['chunk_size'], 1)
+        if options['clear']:
+            AuthorSearchTerm.objects.all().delete()
+        users = User.objects.order_by('id').only(
+            'id', 'username', 'first_name', 'last_name'
+        )
+        last_id = 0
+        processed = 0
+        while True:
+            chunk = list(users.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            index_authors(chunk)
+            processed += len(chunk)
+            last_id = chunk[-1].id
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано авторов: {processed}.'
+        ))
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts.feeds import backfill_timeline
+from posts.models import Follow, FollowerCount, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает число подписчиков авторов и заполняет '
+        'материализованные ленты по существующим подпискам. '
+        'Повторный запуск безопасен.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Предварительно удалить все записи лент.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Сколько подписок обрабатывать в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(options['chunk_size'], 1)
+        if options['clear']:
+            TimelineEntry.objects.all().delete()
+        self.recount_followers()
+        follows = Follow.objects.select_related(
+            'user', 'author'
+        ).order_by('id')
+        last_id = 0
+        processed = 0
+        while True:
+            chunk = list(follows.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            with transaction.atomic():
+                for follow in chunk:
+                    backfill_timeline(follow.user, follow.author)
+            last_id = chunk[-1].id
+            processed += len(chunk)
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты заполнены по {processed} подпискам.'
+        ))
+
+    @staticmethod
+    def recount_followers():
+        totals = Follow.objects.order_by().values('author').annotate(
+            total=Count('id')
+        )
+        with transaction.atomic():
+            FollowerCount.objects.all().delete()
+            FollowerCount.objects.bulk_create(
+                [
+                    FollowerCount(author_id=row['author'], count=row['total'])
+                    for row in totals
+                ],
+                batch_size=500,
+            )
@@ -0,0 +1,166 @@
+import os
+import time
+from concurrent.futures import wait
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.default import kvstore
+
+from posts import caching, thumbnails
+from posts.models import ImageBlob, Post, PostImageVariant
+
+
+class Command(BaseCommand):
+    help = (
+        'Переводит картинки постов в хранилище по содержимому: дубликаты '
+        'сливаются в один файл, файлы без постов удаляются, счётчики '
+        'ссылок пересчитываются. Печатает, сколько места освобождено.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только отчёт, без изменений.',
+        )
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=3600,
+            help='Файлы моложе стольких секунд не считаются брошенными: '
+                 'пост с ними может быть ещё не сохранён.',
+        )
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        self.storage = field.storage
+        self.directory = field.upload_to.strip('/')
+        self.dry_run = options['dry_run']
+        merged, merged_bytes, missing = self.merge_duplicates()
+        orphans, orphan_bytes = self.remove_orphans(options['grace'])
+        if not self.dry_run:
+            self.recount_refs()
+            if merged:
+                caching.bump(caching.SITE)
+            rebuilt = self.rebuild_variants()
+            self.stdout.write(f'Картинок с новыми вариантами: {rebuilt}.')
+        prefix = 'Можно освободить' if self.dry_run else 'Освобождено'
+        self.stdout.write(
+            f'Дубликатов: {merged} ({merged_bytes} байт), '
+            f'без постов: {orphans} ({orphan_bytes} байт), '
+            f'файлов не найдено: {missing}.'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}: {merged_bytes + orphan_bytes} байт.'
+        ))
+
+    def merge_duplicates(self):
+        """Переименовывает файлы по содержимому; повтор уже лежащего
+        файла удаляется, а посты переводятся на общий файл."""
+        names = Post.objects.exclude(image='').order_by('image').values_list(
+            'image', flat=True
+        ).distinct()
+        merged = merged_bytes = missing = 0
+        targets = set()
+        self.renamed = set()
+        if not self.dry_run:
+            names = list(names)
+            kvstore.preload(names)
+        for name in names:
+            try:
+                target = self.storage.hash_file(name, self.directory)
+                size = self.storage.size(name)
+            except (OSError, SuspiciousFileOperation):
+                missing += 1
+                continue
+            if target == name:
+                continue
+            duplicate = target in targets or self.storage.exists(target)
+            targets.add(target)
+            if duplicate:
+                merged += 1
+                merged_bytes += size
+            if self.dry_run:
+                continue
+            # Миниатюры строились по прежнему имени: sorl удаляет их
+            # вместе со своими записями, варианты построятся заново
+            delete_thumbnails(name, delete_file=False)
+            if duplicate:
+                self.storage.delete(name)
+            else:
+                path = self.storage.path(target)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(self.storage.path(name), path)
+            with transaction.atomic():
+                Post.objects.filter(image=name).update(image=target)
+                PostImageVariant.objects.filter(source=name).delete()
+            self.renamed.add(target)
+        return merged, merged_bytes, missing
+
+    def rebuild_variants(self):
+        """Строит варианты картинок, сменивших имя: прежние удалены.
+
+        Дубликат, который ждал задачу для того же файла, во втором
+        проходе получает копию её вариантов.
+        """
+        posts = Post.objects.filter(
+            image__in=sorted(self.renamed)
+        ).select_related('author', 'group')
+        futures = []
+        waiting = []
+        for post in posts:
+            future = thumbnails.submit(
+                post.id, post.image.name, caching.post_versions(post)
+            )
+            if future is None:
+                waiting.append(post)
+            else:
+                futures.append(future)
+        wait(futures)
+        for post in waiting:
+            thumbnails.submit(
+                post.id, post.image.name, caching.post_versions(post)
+            )
+        return sum(1 for future in futures if not future.exception())
+
+    def remove_orphans(self, grace):
+        """Удаляет файлы каталога картинок, на которые не ссылается
+        ни один пост."""
+        root = self.storage.path(self.directory)
+        used = set(Post.objects.values_list('image', flat=True))
+        deadline = time.time() - grace
+        orphans = orphan_bytes = 0
+        for path, _, files in os.walk(root):
+            for filename in files:
+                full_path = os.path.join(path, filename)
+                name = os.path.relpath(
+                    full_path, self.storage.location
+                ).replace(os.sep, '/')
+                stat = os.stat(full_path)
+                if name in used or stat.st_mtime > deadline:
+                    continue
+                orphans += 1
+                orphan_bytes += stat.st_size
+                if not self.dry_run:
+                    delete_thumbnails(name)
+        return orphans, orphan_bytes
+
+    def recount_refs(self):
+        counts = Post.objects.exclude(image='').values('image').annotate(
+            refs=Count('id')
+        ).order_by()
+        blobs = []
+        for row in counts:
+            try:
+                size = self.storage.size(row['image'])
+            except (OSError, SuspiciousFileOperation):
+                size = 0
+            blobs.append(
+                ImageBlob(name=row['image'], size=size, refs=row['refs'])
+            )
+        with transaction.atomic():
+            ImageBlob.objects.all().delete()
+            ImageBlob.objects.bulk_create(blobs, batch_size=500)
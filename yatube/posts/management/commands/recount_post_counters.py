@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Like, Post
+
+# Денормализованный счётчик поста -> модель, строки которой он считает
+COUNTERS = {
+    'like_count': Like,
+    'comment_count': Comment,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счётчики постов порциями по id, '
+        'не блокируя таблицу целиком.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--counter',
+            action='append',
+            choices=sorted(COUNTERS),
+            help='Какой счётчик пересчитать (по умолчанию все).',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Сколько постов обновлять в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        counters = options['counter'] or sorted(COUNTERS)
+        chunk_size = max(options['chunk_size'], 1)
+        bounds = Post.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write('Постов нет, пересчитывать нечего.')
+            return
+        values = {name: self.recount(COUNTERS[name]) for name in counters}
+        updated = 0
+        for start in range(bounds['low'], bounds['high'] + 1, chunk_size):
+            with transaction.atomic():
+                updated += Post.objects.filter(
+                    id__gte=start, id__lt=start + chunk_size
+                ).update(**values)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано {", ".join(counters)} для {updated} постов.'
+        ))
+
+    @staticmethod
+    def recount(model):
+        total = model.objects.filter(
+            post=OuterRef('pk')
+        ).order_by().values('post').annotate(total=Count('pk')).values('total')
+        return Coalesce(Subquery(total), 0)
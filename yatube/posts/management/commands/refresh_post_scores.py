@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post
+from posts.ranking import init_hot_score, refresh_scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинги постов за сутки и неделю, вычитая '
+        'выпавшие из окна лайки. Запускайте по расписанию, например раз '
+        'в час; между запусками лайки учитываются на лету.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hot',
+            action='store_true',
+            help='Заодно пересчитать рейтинг «горячих» постов.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Сколько постов обновлять в одной транзакции (для --hot).',
+        )
+
+    def handle(self, *args, **options):
+        refresh_scores()
+        if options['hot']:
+            self.refresh_hot(max(options['chunk_size'], 1))
+        self.stdout.write(self.style.SUCCESS('Рейтинги постов обновлены.'))
+
+    @staticmethod
+    def refresh_hot(chunk_size):
+        posts = Post.objects.order_by('id').only('id', 'pub_date')
+        last_id = 0
+        while True:
+            chunk = list(posts.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            with transaction.atomic():
+                for post in chunk:
+                    init_hot_score(post)
+            last_id = chunk[-1].id
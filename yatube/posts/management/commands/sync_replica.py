@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from yatube.settings import DATABASE_REPLICAS
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует базу default в реплики SQLite целиком, резервным '
+        'копированием SQLite. Так чтение с реплик проверяется на одной '
+        'машине: между запусками реплика отстаёт, как настоящая.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            action='append',
+            dest='replicas',
+            help='Какую реплику обновить; по умолчанию все из '
+                 'DATABASE_REPLICAS.',
+        )
+
+    def handle(self, *args, **options):
+        replicas = options['replicas'] or DATABASE_REPLICAS
+        if not replicas:
+            raise CommandError('Реплики не заданы: DATABASE_REPLICAS пуст.')
+        source = connections[DEFAULT_DB_ALIAS]
+        source.ensure_connection()
+        for alias in replicas:
+            target = connections[alias]
+            if source.vendor != 'sqlite' or target.vendor != 'sqlite':
+                raise CommandError(f'{alias}: копируются только базы SQLite.')
+            target.ensure_connection()
+            source.connection.backup(target.connection)
+            self.stdout.write(self.style.SUCCESS(
+                f'Реплика {alias} обновлена.'
+            ))
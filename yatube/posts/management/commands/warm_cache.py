@@ -0,0 +1,143 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlencode
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from posts.models import FollowerCount, Group, Post
+from posts.ranking import POPULAR_CHOICES, popular_page
+from posts.utils import paginate
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогревает кэш после выкладки: первые страницы главной ленты, '
+        'популярных постов, самых крупных групп и самых читаемых авторов '
+        'рисуются заранее, как для анонимного читателя.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=3,
+            help='Сколько первых страниц каждой ленты прогревать.',
+        )
+        parser.add_argument(
+            '--groups',
+            type=int,
+            default=10,
+            help='Сколько групп с наибольшим числом постов прогревать.',
+        )
+        parser.add_argument(
+            '--profiles',
+            type=int,
+            default=10,
+            help='Сколько авторов с наибольшим числом подписчиков прогревать.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Число потоков.',
+        )
+        parser.add_argument(
+            '--budget',
+            type=float,
+            default=60,
+            help='Сколько секунд отведено на прогрев; после этого новые '
+                 'страницы не запрашиваются.',
+        )
+
+    def handle(self, *args, **options):
+        pages = max(options['pages'], 1)
+        deadline = time.monotonic() + options['budget']
+        targets = self.targets(options['groups'], options['profiles'])
+        started = time.monotonic()
+        with ThreadPoolExecutor(max(options['workers'], 1)) as executor:
+            results = list(executor.map(
+                lambda target: self.warm(*target, pages, deadline), targets
+            ))
+        warmed = 0
+        for name, count, seconds in results:
+            warmed += count
+            self.stdout.write(f'{name}: страниц {count}, {seconds:.2f} с')
+        elapsed = time.monotonic() - started
+        message = f'Прогрето страниц: {warmed} за {elapsed:.2f} с.'
+        if time.monotonic() > deadline:
+            self.stdout.write(self.style.WARNING(
+                f'{message} Время вышло, прогрев неполный.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+
+    @staticmethod
+    def targets(groups, profiles):
+        """Тройки (адрес, параметры запроса, страница ленты) для прогрева.
+
+        Страница ленты — функция от запроса, которая строит ту же
+        страницу, что и представление: по её пагинатору находится
+        курсор следующей страницы.
+        """
+        posts = Post.objects.all()
+        targets = [(reverse('posts:index'), {}, partial(paginate, posts))]
+        targets += [
+            (
+                reverse('posts:most_popular_index'), {'period': period},
+                partial(popular_page, period),
+            )
+            for period, _ in POPULAR_CHOICES
+        ]
+        slugs = Group.objects.annotate(
+            post_total=Count('posts')
+        ).order_by('-post_total', 'id').values_list('slug', flat=True)
+        targets += [
+            (
+                reverse('posts:group_list', kwargs={'slug': slug}), {},
+                partial(paginate, posts.filter(group__slug=slug)),
+            )
+            for slug in slugs[:max(groups, 0)]
+        ]
+        usernames = FollowerCount.objects.order_by(
+            '-count', 'author_id'
+        ).values_list('author__username', flat=True)
+        targets += [
+            (
+                reverse('posts:profile', kwargs={'username': username}), {},
+                partial(paginate, posts.filter(author__username=username)),
+            )
+            for username in usernames[:max(profiles, 0)]
+        ]
+        return targets
+
+    @staticmethod
+    def warm(path, params, page_of, pages, deadline):
+        """Рисует подряд страницы ленты. Курсор следующей страницы берётся
+        из пагинатора, а не из HTML: адрес тот же, что увидит читатель."""
+        name = f'{path}?{urlencode(params)}' if params else path
+        factory = RequestFactory()
+        match = resolve(path)
+        started = time.monotonic()
+        count = 0
+        try:
+            while count < pages and time.monotonic() < deadline:
+                request = factory.get(path, params)
+                request.user = AnonymousUser()
+                response = match.func(request, *match.args, **match.kwargs)
+                count += 1
+                if response.status_code != 200:
+                    break
+                page = page_of(request)
+                cursor = page.paginator.next_cursor
+                if cursor is None:
+                    break
+                params = {**params, 'page': page.number + 1, 'cursor': cursor}
+        finally:
+            connection.close()
+        return name, count, time.monotonic() - started
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 12:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0016_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowerCount',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='follower_count', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('count', models.PositiveIntegerField(db_index=True, default=0, verbose_name='Количество подписчиков')),
+            ],
+            options={
+                'verbose_name': 'Число подписчиков',
+                'verbose_name_plural': 'Числа подписчиков',
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 2.2.16 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_followercount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostScore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Сутки'), ('week', 'Неделя')], max_length=8, verbose_name='Окно')),
+                ('score', models.PositiveIntegerField(default=0, verbose_name='Лайков за окно')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг поста за период',
+                'verbose_name_plural': 'Рейтинги постов за период',
+            },
+        ),
+        migrations.AddField(
+            model_name='like',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, null=True, verbose_name='Дата и время лайка'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Рейтинг с затуханием по времени'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-like_count', '-pub_date', '-id'], name='post_like_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-hot_score', '-id'], name='post_hot_score_idx'),
+        ),
+        migrations.AddField(
+            model_name='postscore',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scores', to='posts.Post', verbose_name='Пост'),
+        ),
+        migrations.AddIndex(
+            model_name='postscore',
+            index=models.Index(fields=['period', '-score', '-post'], name='post_score_period_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='postscore',
+            constraint=models.UniqueConstraint(fields=('post', 'period'), name='unique_post_score'),
+        ),
+    ]
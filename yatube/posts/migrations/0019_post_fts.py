@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from posts.search import install_fts, uninstall_fts
+
+
+def install(apps, schema_editor):
+    install_fts(schema_editor)
+
+
+def uninstall(apps, schema_editor):
+    uninstall_fts(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_ranking'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 12:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0019_post_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorSearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('u', 'Псевдоним'), ('n', 'Имя или фамилия'), ('t', 'Триграмма')], max_length=1, verbose_name='Вид терма')),
+                ('term', models.CharField(max_length=150, verbose_name='Терм')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Терм поиска авторов',
+                'verbose_name_plural': 'Термы поиска авторов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='authorsearchterm',
+            index=models.Index(fields=['kind', 'term', 'user'], name='author_search_term_idx'),
+        ),
+    ]
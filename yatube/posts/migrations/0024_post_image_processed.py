@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_image_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_processed',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Картинка проверена и очищена от метаданных'),
+        ),
+    ]
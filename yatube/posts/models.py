@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from core.storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -62,17 +63,85 @@ class Post(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='posts/',
-        blank=True
+        storage=ContentAddressedStorage(),
+        blank=True,
+        width_field='image_width',
+        height_field='image_height',
+    )
+    image_width = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Ширина картинки',
+    )
+    image_height = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Высота картинки',
+    )
+    image_portrait = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Картинка вытянута по вертикали',
+    )
+    image_processed = models.BooleanField(
+        default=True,
+        editable=False,
+        verbose_name='Картинка проверена и очищена от метаданных',
+    )
+    like_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество лайков',
+    )
+    comment_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев',
+    )
+    hot_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Рейтинг с затуханием по времени',
     )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-like_count', '-pub_date', '-id'],
+                name='post_like_count_idx'
+            ),
+            models.Index(
+                fields=['-hot_score', '-id'],
+                name='post_hot_score_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def update_orientation(self):
+        self.image_portrait = bool(
+            self.image_width and self.image_height
+            and self.image_height > self.image_width
+        )
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -100,6 +169,12 @@ class Comment(models.Model):
         ordering = ['-created']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-created'],
+                name='comment_post_created_idx'
+            )
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -128,6 +203,12 @@ class Follow(models.Model):
                 name='unique_follow'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            )
+        ]
 
 
 class Like(models.Model):
@@ -143,6 +224,12 @@ class Like(models.Model):
         related_name='likes',
         verbose_name='Пост, который лайкают'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        null=True,
+        db_index=True,
+        verbose_name='Дата и время лайка'
+    )
 
     class Meta:
         verbose_name = 'Лайк'
@@ -152,4 +239,229 @@ class Like(models.Model):
                 fields=['user', 'post'],
                 name='unique_like'
             )
-        ]
\ No newline at end of file
+        ]
+
+
+class PostScore(models.Model):
+    """Число лайков поста за скользящее окно (сутки или неделя).
+
+    Лайки и их отмена меняют счёт на месте; выпавшие из окна лайки
+    вычитаются периодическим пересчётом refresh_post_scores."""
+    DAY = 'day'
+    WEEK = 'week'
+    PERIOD_CHOICES = (
+        (DAY, 'Сутки'),
+        (WEEK, 'Неделя'),
+    )
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='scores',
+        verbose_name='Пост'
+    )
+    period = models.CharField(
+        max_length=8,
+        choices=PERIOD_CHOICES,
+        verbose_name='Окно'
+    )
+    score = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Лайков за окно'
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг поста за период'
+        verbose_name_plural = 'Рейтинги постов за период'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'period'],
+                name='unique_post_score'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['period', '-score', '-post'],
+                name='post_score_period_idx'
+            )
+        ]
+
+
+class FollowerCount(models.Model):
+    """Денормализованное число подписчиков автора.
+
+    По нему лента подписок решает, раскладывать ли посты автора
+    по лентам (push) или дочитывать их при чтении (pull)."""
+    author = models.OneToOneField(
+        User,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='follower_count',
+        verbose_name='Автор'
+    )
+    count = models.PositiveIntegerField(
+        default=0,
+        db_index=True,
+        verbose_name='Количество подписчиков'
+    )
+
+    class Meta:
+        verbose_name = 'Число подписчиков'
+        verbose_name_plural = 'Числа подписчиков'
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок читателя.
+
+    Заполняется при публикации (fan-out on write), поэтому лента
+    читается одним диапазоном по индексу (user, -pub_date)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель ленты'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации поста'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'
+            )
+        ]
+
+
+class AuthorSearchTerm(models.Model):
+    """Нормализованные термы для поиска авторов.
+
+    Псевдоним и слова имени хранятся в нижнем регистре (ё -> е) для
+    поиска по префиксу диапазоном индекса, триграммы — для поиска по
+    подстроке."""
+    USERNAME = 'u'
+    NAME = 'n'
+    TRIGRAM = 't'
+    KIND_CHOICES = (
+        (USERNAME, 'Псевдоним'),
+        (NAME, 'Имя или фамилия'),
+        (TRIGRAM, 'Триграмма'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Автор'
+    )
+    kind = models.CharField(
+        max_length=1,
+        choices=KIND_CHOICES,
+        verbose_name='Вид терма'
+    )
+    term = models.CharField(
+        max_length=150,
+        verbose_name='Терм'
+    )
+
+    class Meta:
+        verbose_name = 'Терм поиска авторов'
+        verbose_name_plural = 'Термы поиска авторов'
+        indexes = [
+            models.Index(
+                fields=['kind', 'term', 'user'],
+                name='author_search_term_idx'
+            )
+        ]
+
+
+class PostImageVariant(models.Model):
+    """Готовый вариант картинки поста заданной ширины и формата.
+
+    Варианты строит пул процессов после загрузки. По этой таблице шаблон
+    собирает srcset, не проверяя наличие файлов в хранилище."""
+    WEBP = 'webp'
+    JPEG = 'jpeg'
+    FORMAT_CHOICES = (
+        (WEBP, 'WebP'),
+        (JPEG, 'JPEG'),
+    )
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='image_variants',
+        verbose_name='Пост'
+    )
+    source = models.CharField(
+        max_length=100,
+        verbose_name='Исходная картинка'
+    )
+    format = models.CharField(
+        max_length=4,
+        choices=FORMAT_CHOICES,
+        verbose_name='Формат'
+    )
+    width = models.PositiveIntegerField(verbose_name='Ширина')
+    height = models.PositiveIntegerField(verbose_name='Высота')
+    name = models.CharField(
+        max_length=255,
+        verbose_name='Файл в хранилище'
+    )
+
+    class Meta:
+        ordering = ['width']
+        verbose_name = 'Вариант картинки'
+        verbose_name_plural = 'Варианты картинок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'format', 'width'],
+                name='unique_post_image_variant'
+            )
+        ]
+
+
+class ImageBlob(models.Model):
+    """Файл картинки в хранилище по содержимому и число постов,
+    которые на него ссылаются.
+
+    Дубликаты одной картинки делят файл; файл без ссылок удаляет
+    команда reclaim_media."""
+    name = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='Файл в хранилище'
+    )
+    size = models.BigIntegerField(
+        default=0,
+        verbose_name='Размер, байт'
+    )
+    refs = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число постов с этой картинкой'
+    )
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
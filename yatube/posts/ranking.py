@@ -0,0 +1,123 @@
+import math
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest, Log
+from django.utils import timezone
+from yatube.settings import HOT_SCORE_DECAY, NUM_OF_POSTS_ON_PAGE
+
+from . import caching
+from .models import Like, Post, PostScore
+from .utils import CursorPaginator
+
+ALL_TIME = 'all'
+HOT = 'hot'
+PERIODS = {
+    PostScore.DAY: timedelta(days=1),
+    PostScore.WEEK: timedelta(days=7),
+}
+POPULAR_CHOICES = (
+    (ALL_TIME, 'За всё время'),
+    (PostScore.WEEK, 'За неделю'),
+    (PostScore.DAY, 'За сутки'),
+    (HOT, 'Горячие'),
+)
+
+
+def hot_score(like_count, pub_date):
+    """Рейтинг с затуханием: log10 лайков плюс «возраст» публикации.
+
+    Слагаемое от даты постоянно для поста, поэтому рейтинг меняется
+    только при лайках, а свежие посты сами обгоняют старые.
+    Принимает число или выражение над like_count.
+    """
+    freshness = pub_date.timestamp() / HOT_SCORE_DECAY
+    return Log(10, Greatest(like_count, Value(1))) + Value(freshness)
+
+
+def hot_score_of(post):
+    """Тот же рейтинг, посчитанный в Python, — для поста до записи.
+
+    У нового поста pub_date проставит вставка; рейтинг считается от
+    текущего времени, расхождение в доли секунды ничего не меняет.
+    """
+    pub_date = post.pub_date or timezone.now()
+    return (
+        math.log10(max(post.like_count, 1))
+        + pub_date.timestamp() / HOT_SCORE_DECAY
+    )
+
+
+def init_hot_score(post):
+    Post.objects.filter(id=post.id).update(
+        hot_score=hot_score(F('like_count'), post.pub_date)
+    )
+
+
+def record_like(like, delta):
+    """Меняет все счётчики поста после лайка (delta=1) или отмены (-1)."""
+    post = like.post
+    posts = Post.objects.filter(id=post.id)
+    if delta < 0:
+        posts = posts.filter(like_count__gt=0)
+    like_count = F('like_count') + delta
+    posts.update(
+        like_count=like_count,
+        hot_score=hot_score(like_count, post.pub_date),
+    )
+    now = timezone.now()
+    for period, length in PERIODS.items():
+        if like.created is None or like.created < now - length:
+            continue
+        if delta > 0:
+            PostScore.objects.get_or_create(post=post, period=period)
+        PostScore.objects.filter(
+            post=post, period=period, score__gte=-delta
+        ).update(score=F('score') + delta)
+
+
+def refresh_scores():
+    """Пересчитывает окна по лайкам, чтобы вычесть устаревшие."""
+    now = timezone.now()
+    for period, length in PERIODS.items():
+        totals = Like.objects.filter(
+            created__gte=now - length
+        ).order_by().values('post').annotate(total=Count('id'))
+        with transaction.atomic():
+            PostScore.objects.filter(period=period).delete()
+            PostScore.objects.bulk_create(
+                [
+                    PostScore(
+                        post_id=row['post'],
+                        period=period,
+                        score=row['total'],
+                    )
+                    for row in totals
+                ],
+                batch_size=500,
+            )
+    caching.bump(caching.POPULAR)
+
+
+def popular_page(period, request):
+    """Страница популярных постов — чтение верхушки готового индекса."""
+    page_number = request.GET.get('page')
+    cursor = request.GET.get('cursor')
+    posts = Post.objects.select_related('author', 'group')
+    if period in PERIODS:
+        scores = PostScore.objects.filter(
+            period=period, score__gt=0
+        ).select_related('post__author', 'post__group')
+        paginator = CursorPaginator(
+            scores, NUM_OF_POSTS_ON_PAGE, ('-score', '-post_id')
+        )
+        page_obj = paginator.get_page(page_number, cursor)
+        page_obj.object_list = [score.post for score in page_obj.object_list]
+        return page_obj
+    if period == HOT:
+        ordering = ('-hot_score', '-id')
+    else:
+        ordering = ('-like_count', '-pub_date', '-id')
+    paginator = CursorPaginator(posts, NUM_OF_POSTS_ON_PAGE, ordering)
+    return paginator.get_page(page_number, cursor)
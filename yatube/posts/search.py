@@ -0,0 +1,334 @@
+import re
+from functools import lru_cache
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections, router, transaction
+from django.db.models import Case, Count, IntegerField, Value, When
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from yatube.settings import AUTHOR_SEARCH_LIMIT, NUM_OF_POSTS_ON_PAGE
+
+from .models import AuthorSearchTerm, Post
+from .utils import CursorPaginator, paginate
+
+FTS_TABLE = 'posts_post_fts'
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+# Окончания, которые отбрасываются у слов запроса: поиск идёт по основе
+# как по префиксу, так что «посты», «постов» и «пост» находят друг друга
+RUSSIAN_ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях',
+    'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ая', 'яя', 'ое', 'ее',
+    'ие', 'ые', 'ой', 'ей', 'ий', 'ый', 'ую', 'юю', 'ов', 'ев',
+    'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ия', 'ья', 'ью', 'ию',
+    'ешь', 'ете', 'ить', 'ать', 'ять', 'еть', 'ться', 'ла', 'ло', 'ли',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+MIN_STEM = 3
+TRIGRAM = 3
+# Поля пользователя, по которым строится индекс поиска авторов
+AUTHOR_FIELDS = ('username', 'first_name', 'last_name')
+
+User = get_user_model()
+
+
+def normalize_sql(column):
+    """SQL-выражение: ё и Ё индексируются как е, чтобы «ёлка» == «елка»."""
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def normalize_text(text):
+    """То же в Python. Замена буква на букву не меняет длину текста."""
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def install_fts(schema_editor):
+    """Создаёт FTS5-индекс по Post.text и триггеры синхронизации."""
+    db_connection = schema_editor.connection
+    if not fts5_supported(db_connection):
+        return
+    tables = db_connection.introspection.table_names()
+    if FTS_TABLE not in tables:
+        with db_connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+                f"text, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE}(rowid, text) '
+                f'SELECT id, {normalize_sql("text")} FROM posts_post'
+            )
+    install_fts_triggers(db_connection)
+
+
+def install_fts_triggers(db_connection):
+    """Триггеры, которые держат FTS5-индекс в согласии с posts_post.
+
+    SQLite теряет их, когда миграция пересобирает posts_post (AddField,
+    AlterField), поэтому после каждого migrate они ставятся заново
+    обработчиком post_migrate. Повторный вызов безопасен; базу без
+    индекса (миграции до 0019 или не SQLite) он не трогает.
+    """
+    if db_connection.vendor != 'sqlite':
+        return
+    if FTS_TABLE not in db_connection.introspection.table_names():
+        return
+    with db_connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert '
+            f'AFTER INSERT ON posts_post BEGIN '
+            f'INSERT INTO {FTS_TABLE}(rowid, text) '
+            f'VALUES (new.id, {normalize_sql("new.text")}); END'
+        )
+        cursor.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update '
+            f'AFTER UPDATE OF text ON posts_post BEGIN '
+            f'UPDATE {FTS_TABLE} SET text = {normalize_sql("new.text")} '
+            f'WHERE rowid = new.id; END'
+        )
+        cursor.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete '
+            f'AFTER DELETE ON posts_post BEGIN '
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = old.id; END'
+        )
+
+
+def uninstall_fts(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for action in ('insert', 'update', 'delete'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{action}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def fts5_supported(db_connection):
+    if db_connection.vendor != 'sqlite':
+        return False
+    with db_connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+@lru_cache(maxsize=None)
+def _fts_installed(database_name):
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def fts_available():
+    if connection.vendor != 'sqlite':
+        return False
+    return _fts_installed(connection.settings_dict['NAME'])
+
+
+def stem(word):
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def match_expression(query):
+    """Запрос пользователя -> выражение MATCH: все основы как префиксы."""
+    words = re.findall(r'\w+', query.lower().replace('ё', 'е'))
+    return ' '.join(f'"{stem(word)}"*' for word in words)
+
+
+def highlight(text, marked):
+    """Переносит пометки совпадений из текста индекса на текст поста.
+
+    В индексе лежит нормализованный текст той же длины, поэтому позиции
+    символов совпадают. Если пост успели изменить и тексты разошлись,
+    возвращает None — карточка покажет текст без подсветки.
+    """
+    pieces = re.split(f'([{MARK_START}{MARK_END}])', marked)
+    plain = ''.join(
+        piece for piece in pieces if piece not in (MARK_START, MARK_END)
+    )
+    if plain != normalize_text(text):
+        return None
+    html = []
+    position = 0
+    for piece in pieces:
+        if piece == MARK_START:
+            html.append('<mark>')
+        elif piece == MARK_END:
+            html.append('</mark>')
+        else:
+            html.append(escape(text[position:position + len(piece)]))
+            position += len(piece)
+    return mark_safe(''.join(html))
+
+
+class SearchPaginator(CursorPaginator):
+    """Постраничная выдача FTS5 по релевантности BM25 (меньше — лучше)."""
+
+    def __init__(self, match, per_page):
+        self.match = match
+        super().__init__(
+            Post.objects.none(), per_page, ordering=('search_rank', 'id')
+        )
+
+    def fetch(self, values, backwards, offset, limit):
+        direction = 'DESC' if backwards else 'ASC'
+        params = [self.match]
+        where = ''
+        if values is not None:
+            compare = '<' if backwards else '>'
+            where = (
+                f'AND (rank {compare} %s '
+                f'OR (rank = %s AND rowid {compare} %s))'
+            )
+            params += [values[0], values[0], values[1]]
+        params += [limit, offset]
+        with connections[router.db_for_read(Post)].cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, rank, highlight({FTS_TABLE}, 0, %s, %s) '
+                f'FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s {where} '
+                f'ORDER BY rank {direction}, rowid {direction} '
+                f'LIMIT %s OFFSET %s',
+                [MARK_START, MARK_END] + params,
+            )
+            rows = cursor.fetchall()
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [post_id for post_id, _, _ in rows]
+        )
+        found = []
+        for post_id, rank, marked in rows:
+            post = posts.get(post_id)
+            if post is None:
+                continue
+            post.search_rank = rank
+            post.highlighted = highlight(post.text, marked)
+            found.append(post)
+        return found
+
+
+def search_posts(query, request):
+    """Поиск постов: FTS5 с BM25, либо LIKE, если FTS5 недоступен."""
+    if not fts_available():
+        posts = Post.objects.select_related('author', 'group').filter(
+            text__icontains=query
+        )
+        return paginate(posts, request)
+    paginator = SearchPaginator(match_expression(query), NUM_OF_POSTS_ON_PAGE)
+    if not paginator.match:
+        return paginate(Post.objects.none(), request)
+    return paginator.get_page(
+        request.GET.get('page'), request.GET.get('cursor')
+    )
+
+
+def normalize_term(value):
+    return value.casefold().replace('ё', 'е')
+
+
+def trigrams(value):
+    return {
+        value[i:i + TRIGRAM] for i in range(len(value) - TRIGRAM + 1)
+    }
+
+
+def author_terms(user):
+    """Термы индекса для одного пользователя."""
+    username = normalize_term(user.username)
+    words = re.findall(
+        r'\w+', normalize_term(f'{user.first_name} {user.last_name}')
+    )
+    terms = {(AuthorSearchTerm.USERNAME, username)}
+    terms.update((AuthorSearchTerm.NAME, word) for word in words)
+    for value in [username] + words:
+        terms.update(
+            (AuthorSearchTerm.TRIGRAM, gram) for gram in trigrams(value)
+        )
+    return [
+        AuthorSearchTerm(user_id=user.id, kind=kind, term=term)
+        for kind, term in terms
+    ]
+
+
+def index_authors(users):
+    """Перестраивает термы пользователей: при регистрации и смене профиля."""
+    users = list(users)
+    with transaction.atomic():
+        AuthorSearchTerm.objects.filter(
+            user_id__in=[user.id for user in users]
+        ).delete()
+        AuthorSearchTerm.objects.bulk_create(
+            [term for user in users for term in author_terms(user)],
+            batch_size=500,
+        )
+
+
+def _prefix_user_ids(kind, prefix):
+    """Префикс — диапазон [prefix, prefix + max) по индексу (kind, term)."""
+    return AuthorSearchTerm.objects.filter(
+        kind=kind, term__gte=prefix, term__lt=prefix + '\U0010ffff'
+    ).order_by('term').values_list('user_id', flat=True)
+
+
+def _infix_user_ids(query):
+    """Подстрока: пользователи, у которых есть все триграммы запроса."""
+    grams = trigrams(query)
+    return AuthorSearchTerm.objects.filter(
+        kind=AuthorSearchTerm.TRIGRAM, term__in=grams
+    ).values('user_id').annotate(
+        found=Count('id')
+    ).filter(found=len(grams)).order_by().values_list('user_id', flat=True)
+
+
+def rank_authors(query, limit=AUTHOR_SEARCH_LIMIT):
+    """Кандидаты по группам совпадений, лучшие первыми.
+
+    0 — точное совпадение псевдонима, 1 — префикс псевдонима,
+    2 — префикс имени или фамилии, 3 — подстрока по триграммам.
+    Из каждой группы берётся не больше limit пользователей; второе
+    значение — признак, что какая-то группа обрезана.
+    """
+    query = normalize_term(query.strip())
+    ranks = {}
+    truncated = False
+    if not query:
+        return ranks, truncated
+    groups = [
+        AuthorSearchTerm.objects.filter(
+            kind=AuthorSearchTerm.USERNAME, term=query
+        ).values_list('user_id', flat=True),
+        _prefix_user_ids(AuthorSearchTerm.USERNAME, query),
+        _prefix_user_ids(AuthorSearchTerm.NAME, query),
+    ]
+    if len(query) >= TRIGRAM:
+        groups.append(_infix_user_ids(query))
+    for rank, user_ids in enumerate(groups):
+        user_ids = list(user_ids[:limit + 1])
+        truncated = truncated or len(user_ids) > limit
+        for user_id in user_ids[:limit]:
+            ranks.setdefault(user_id, rank)
+    return ranks, truncated
+
+
+def search_authors(query, request):
+    """Поиск авторов по индексу термов вместо LIKE по всей таблице.
+
+    Если группа совпадений обрезана, у страницы есть search_limit:
+    шаблон предлагает уточнить запрос.
+    """
+    ranks, truncated = rank_authors(query, AUTHOR_SEARCH_LIMIT)
+    by_rank = {}
+    for user_id, rank in ranks.items():
+        by_rank.setdefault(rank, []).append(user_id)
+    authors = User.objects.filter(id__in=list(ranks)).annotate(
+        search_rank=Case(
+            *[
+                When(id__in=user_ids, then=Value(rank))
+                for rank, user_ids in sorted(by_rank.items())
+            ],
+            default=Value(len(by_rank)),
+            output_field=IntegerField(),
+        )
+    )
+    page_obj = paginate(authors, request, ('search_rank', 'username', 'id'))
+    page_obj.search_limit = AUTHOR_SEARCH_LIMIT if truncated else None
+    return page_obj
@@ -0,0 +1,161 @@
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from . import blobs, caching, feeds, ranking, search
+from .models import Comment, Follow, Group, Like, Post, User
+from .typeahead import typeahead
+
+
+# Размеры картинки записываются, когда файл присваивается полю, — при
+# загрузке через форму. Обработчик post_init, который Django подключает
+# для полей размеров, открывал бы при чтении из базы картинку каждого
+# поста, у которого размеров ещё нет, поэтому он отключён
+post_init.disconnect(
+    Post._meta.get_field('image').update_dimension_fields, sender=Post
+)
+
+# id постов, которые удаляются сейчас. Их лайки и комментарии уходят
+# каскадом: счётчики удаляются вместе с постом, версии сдвинет
+# post_deleted, так что на каждую строку ничего не читается
+deleting_posts = set()
+
+
+def cascade_post(instance):
+    """Пост лайка или комментария с автором и группой — одним запросом.
+
+    None, если пост удаляется целиком или его уже нет.
+    """
+    if instance.post_id in deleting_posts:
+        return None
+    post = Post.objects.select_related('author', 'group').filter(
+        id=instance.post_id
+    ).first()
+    if post is not None:
+        instance.post = post
+    return post
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    if update_fields and not set(update_fields) & set(search.AUTHOR_FIELDS):
+        return
+    search.index_authors([instance])
+    typeahead.add_user(instance)
+    if not created:
+        caching.bump(caching.SITE)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    typeahead.remove_user(instance)
+    caching.bump(caching.SITE)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    typeahead.add_group(instance)
+    if not created:
+        caching.bump(caching.SITE)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    typeahead.remove_group(instance)
+    caching.bump(caching.SITE)
+
+
+@receiver(post_save, sender=Like)
+def like_created(sender, instance, created, **kwargs):
+    if created:
+        ranking.record_like(instance, 1)
+        caching.bump(*caching.post_versions(instance.post))
+
+
+@receiver(post_delete, sender=Like)
+def like_deleted(sender, instance, **kwargs):
+    post = cascade_post(instance)
+    if post is None:
+        return
+    ranking.record_like(instance, -1)
+    caching.bump(*caching.post_versions(post))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(id=instance.post_id).update(
+            comment_count=F('comment_count') + 1
+        )
+        caching.bump(*caching.post_versions(instance.post))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    post = cascade_post(instance)
+    if post is None:
+        return
+    Post.objects.filter(id=post.id, comment_count__gt=0).update(
+        comment_count=F('comment_count') - 1
+    )
+    caching.bump(*caching.post_versions(post))
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    # Группа до правки: пост должен пропасть и из ленты прежней группы
+    instance._initial_group_id = instance.group_id
+    # Картинка до правки: её счётчик ссылок уменьшится. Отложенное поле
+    # не читается, чтобы не делать лишний запрос
+    image = instance.__dict__.get('image')
+    instance._initial_image = getattr(image, 'name', image)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    instance.update_orientation()
+    # Рейтинг пишется той же вставкой или UPDATE, что и сам пост. Правка
+    # через update_fields его не касается: он меняется только от лайков
+    instance.hot_score = ranking.hot_score_of(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        feeds.fan_out_post(instance)
+    else:
+        feeds.sync_pub_date(instance)
+    old_slug = None
+    if instance._initial_group_id not in (None, instance.group_id):
+        old_slug = Group.objects.filter(
+            id=instance._initial_group_id
+        ).values_list('slug', flat=True).first()
+    caching.bump(*caching.post_versions(instance, old_slug))
+    instance._initial_group_id = instance.group_id
+    blobs.track(instance, created)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    deleting_posts.add(instance.id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    deleting_posts.discard(instance.id)
+    caching.bump(*caching.post_versions(instance))
+    blobs.release(instance._initial_image)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        feeds.change_follower_count(instance.author, 1)
+        feeds.backfill_timeline(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    feeds.change_follower_count(instance.author, -1)
+    feeds.prune_timeline(instance.user, instance.author)
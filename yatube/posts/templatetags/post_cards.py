@@ -0,0 +1,131 @@
+import re
+from collections import namedtuple
+
+from django import template
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+from core.routers import cache_timeout
+from yatube.settings import FRAGMENT_CACHE_TIMEOUT
+
+from posts import caching, thumbnails
+from posts.models import Like
+
+register = template.Library()
+
+LIKE_HOLE = '<!--like:{}-->'
+LIKE_HOLE_RE = re.compile(r'<!--like:(\d+)-->')
+TEXT_HOLE = '<!--text-->'
+SEPARATOR_HOLE = '<!--separator-->'
+# Флаг контекста: лайки вставит объемлющий {% viewer_holes %}
+DEFER_LIKES = 'defer_like_holes'
+# Всё, что кнопке лайка нужно знать о посте
+LikeState = namedtuple('LikeState', 'id is_like')
+
+
+def static_card(post, page_obj):
+    """HTML карточки без частей, зависящих от зрителя и выдачи.
+
+    Карточки всей страницы читаются из кэша одним запросом при первой
+    карточке, поэтому на тёплом кэше ни автор, ни группа, ни варианты
+    картинки поста из базы не запрашиваются.
+    """
+    cards = getattr(page_obj, 'cached_cards', {})
+    if post.id not in cards:
+        posts = list(page_obj or [])
+        if post not in posts:
+            posts = [post]
+        cards.update(caching.cached_cards(posts))
+        # Варианты картинок для всех промахов страницы — одним запросом
+        prefetch_related_objects(
+            [item for item in posts if cards[item.id][1] is None],
+            'image_variants',
+        )
+        if page_obj is not None:
+            page_obj.cached_cards = cards
+    key, html = cards[post.id]
+    if html is None:
+        html = render_to_string('posts/includes/post_card.html', {
+            'post': post,
+            'like_hole': mark_safe(LIKE_HOLE.format(post.id)),
+            'text_hole': mark_safe(TEXT_HOLE),
+            'separator_hole': mark_safe(SEPARATOR_HOLE),
+        })
+        cache.set(key, html, cache_timeout(FRAGMENT_CACHE_TIMEOUT))
+        cards[post.id] = (key, html)
+    return html
+
+
+def viewer_likes(post_ids, user):
+    """Состояние кнопок лайка по одним id постов — один запрос, и то
+    только для вошедшего зрителя."""
+    liked = set()
+    if user is not None and user.is_authenticated and post_ids:
+        liked = set(Like.objects.filter(
+            user=user, post_id__in=post_ids
+        ).values_list('post_id', flat=True))
+    return {
+        post_id: LikeState(post_id, post_id in liked) for post_id in post_ids
+    }
+
+
+def fill_likes(html, posts, context):
+    """Вставляет кнопку лайка с состоянием текущего зрителя."""
+    def like_button(match):
+        post = posts.get(int(match.group(1)))
+        if post is None:
+            return ''
+        return render_to_string('posts/includes/like_button.html', {
+            'post': post, 'user': context.get('user'),
+        })
+    return LIKE_HOLE_RE.sub(like_button, html)
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    html = static_card(post, context.get('page_obj'))
+    text = getattr(post, 'highlighted', None) or post.text
+    separator = '' if context.get('forloop', {}).get('last') else '<hr>'
+    html = html.replace(TEXT_HOLE, conditional_escape(text)).replace(
+        SEPARATOR_HOLE, separator
+    )
+    if not context.get(DEFER_LIKES):
+        html = fill_likes(html, {post.id: post}, context)
+    return mark_safe(html)
+
+
+@register.simple_tag
+def image_variants(post):
+    """Варианты картинки поста для srcset, если они уже построены."""
+    return thumbnails.ready_variants(post)
+
+
+class ViewerHolesNode(template.Node):
+    def __init__(self, nodelist):
+        self.nodelist = nodelist
+
+    def render(self, context):
+        with context.push(**{DEFER_LIKES: True}):
+            html = self.nodelist.render(context)
+        page_obj = context.get('page_obj')
+        if getattr(page_obj, 'loaded', True):
+            posts = {post.id: post for post in page_obj or []}
+        else:
+            # Фрагмент взят из кэша, и страница не читалась: лайкам
+            # зрителя хватает id из дырок
+            posts = viewer_likes(
+                [int(post_id) for post_id in LIKE_HOLE_RE.findall(html)],
+                context.get('user'),
+            )
+        return mark_safe(fill_likes(html, posts, context))
+
+
+@register.tag
+def viewer_holes(parser, token):
+    """Блок, внутри которого лайки зрителя вставляются уже после {% cache %}:
+    закэшированный фрагмент ленты общий для всех зрителей."""
+    nodelist = parser.parse(('endviewer_holes',))
+    parser.delete_first_token()
+    return ViewerHolesNode(nodelist)
@@ -7,5 +7,8 @@ register = template.Library()
 def query_transform(context, **kwargs):
     query = context['request'].GET.copy()
     for k, v in kwargs.items():
-        query[k] = v
+        if v is None or v == '':
+            query.pop(k, None)
+        else:
+            query[k] = v
     return query.urlencode()
\ No newline at end of file
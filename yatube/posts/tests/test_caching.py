@@ -0,0 +1,115 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from .. import caching
+
+THREADS = 100
+
+
+class Clock:
+    """Часы single_flight, которые идут только вручную."""
+
+    sleep = staticmethod(time.sleep)
+    time_ns = staticmethod(time.time_ns)
+
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self):
+        return self.now
+
+
+class SingleFlightTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+
+    def compute(self):
+        with self.calls_lock:
+            self.calls += 1
+            value = self.calls
+        time.sleep(0.1)
+        return value
+
+    def in_parallel(self, target):
+        barrier = threading.Barrier(THREADS)
+        results = [None] * THREADS
+
+        def run(i):
+            barrier.wait()
+            results[i] = target()
+
+        threads = [
+            threading.Thread(target=run, args=(i,)) for i in range(THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_one_recompute_per_expiry(self):
+        """100 параллельных запросов: один пересчёт на каждое истечение."""
+        def get():
+            return caching.single_flight('key', self.compute, 1, beta=0)
+
+        clock = Clock()
+        with mock.patch('posts.caching.time', clock):
+            self.assertEqual(self.in_parallel(get), [1] * THREADS)
+            self.assertEqual(self.calls, 1)
+            clock.now += 2
+            results = self.in_parallel(get)
+        self.assertEqual(self.calls, 2)
+        # Пока идёт пересчёт, остальные получают прежнее значение
+        self.assertEqual(set(results), {1, 2})
+
+    def test_stale_version_recomputed_once(self):
+        version = {'current': 1}
+
+        def get():
+            return caching.single_flight(
+                'key', lambda: (version['current'], self.compute()), 60,
+                is_fresh=lambda value: value[0] == version['current'],
+            )
+
+        get()
+        version['current'] = 2
+        self.in_parallel(get)
+        self.assertEqual(self.calls, 2)
+
+    def test_early_refresh(self):
+        """Близко к сроку значение пересчитывается заранее."""
+        caching.single_flight('key', self.compute, 1)
+        with mock.patch('posts.caching.random.random', return_value=1 - 1e-9):
+            caching.single_flight('key', self.compute, 1, beta=1)
+        self.assertEqual(self.calls, 2)
+        caching.single_flight('key', self.compute, 1, beta=0)
+        self.assertEqual(self.calls, 2)
+
+    def test_anonymous_page_rendered_once(self):
+        """Страница после сдвига версии перерисовывается одним потоком."""
+        renders = []
+
+        @caching.anonymous_page
+        def view(request):
+            caching.depends_on(request, caching.INDEX)
+            renders.append(1)
+            time.sleep(0.1)
+            return HttpResponse(f'render {len(renders)}')
+
+        factory = RequestFactory()
+        self.in_parallel(lambda: view(factory.get('/')))
+        self.assertEqual(len(renders), 1)
+        caching.bump(caching.INDEX)
+        responses = self.in_parallel(lambda: view(factory.get('/')))
+        self.assertEqual(len(renders), 2)
+        self.assertEqual(
+            {response.content for response in responses},
+            {b'render 1', b'render 2'},
+        )
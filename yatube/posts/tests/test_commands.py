@@ -0,0 +1,259 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from PIL import Image
+from yatube.settings import NUM_OF_POSTS_ON_PAGE
+
+from .. import thumbnails
+from ..models import (Comment, Follow, Group, ImageBlob, Like, Post,
+                      PostImageVariant)
+from .test_thumbnails import FakeThumbnail
+from ..utils import paginate
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class RecountPostCountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.readers = [
+            User.objects.create_user(username=f'reader{i}') for i in range(3)
+        ]
+        cls.posts = [
+            Post.objects.create(text=f'Пост {i}', author=cls.author)
+            for i in range(5)
+        ]
+        for reader in cls.readers:
+            Like.objects.create(user=reader, post=cls.posts[0])
+        Like.objects.create(user=cls.readers[0], post=cls.posts[3])
+        for reader in cls.readers[:2]:
+            Comment.objects.create(
+                post=cls.posts[1], author=reader, text='Комментарий'
+            )
+
+    def test_recount_repairs_drifted_counters(self):
+        """Команда восстанавливает рассинхронизированные счётчики."""
+        Post.objects.update(like_count=42, comment_count=42)
+        call_command(
+            'recount_post_counters', chunk_size=2, stdout=StringIO()
+        )
+        expected = {
+            post.id: (
+                Like.objects.filter(post=post).count(),
+                Comment.objects.filter(post=post).count(),
+            )
+            for post in self.posts
+        }
+        actual = {
+            post_id: (likes, comments)
+            for post_id, likes, comments in Post.objects.values_list(
+                'id', 'like_count', 'comment_count'
+            )
+        }
+        self.assertEqual(actual, expected)
+
+    def test_recount_single_counter(self):
+        """Можно пересчитать только выбранный счётчик."""
+        Post.objects.update(like_count=42, comment_count=42)
+        call_command(
+            'recount_post_counters', counter=['comment_count'],
+            stdout=StringIO()
+        )
+        self.assertEqual(
+            set(Post.objects.values_list('like_count', flat=True)), {42}
+        )
+        self.posts[1].refresh_from_db()
+        self.assertEqual(self.posts[1].comment_count, 2)
+
+
+class WarmCacheTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Post.objects.bulk_create([
+            Post(text=f'Пост {i}', author=self.author, group=self.group)
+            for i in range(NUM_OF_POSTS_ON_PAGE + 1)
+        ])
+
+    def test_pages_served_from_cache(self):
+        """После прогрева анонимные страницы отдаются без базы."""
+        out = StringIO()
+        call_command('warm_cache', pages=2, workers=2, stdout=out)
+        output = out.getvalue()
+        self.assertIn('/group/group/: страниц 2', output)
+        self.assertIn('/profile/author/: страниц 2', output)
+        self.assertIn('/most_popular/?period=hot: страниц 2', output)
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        ):
+            with self.subTest(url=url), self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_next_page_cursor_from_paginator(self):
+        """Вторая страница прогревается по курсору из пагинатора."""
+        call_command('warm_cache', pages=2, stdout=StringIO())
+        cursor = paginate(
+            Post.objects.all(), RequestFactory().get('/')
+        ).paginator.next_cursor
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                reverse('posts:index'), {'page': 2, 'cursor': cursor}
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_budget(self):
+        out = StringIO()
+        call_command('warm_cache', budget=0, stdout=out)
+        self.assertIn('Прогрето страниц: 0', out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BackfillImageSizesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def save_image(self, name, size):
+        file_obj = BytesIO()
+        Image.new('RGB', size).save(file_obj, 'png')
+        return default_storage.save(name, ContentFile(file_obj.getvalue()))
+
+    def test_backfill_image_sizes(self):
+        """Команда записывает размеры картинок старых постов."""
+        sizes = [(40, 20), (20, 40), (30, 30)]
+        posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=self.author,
+                image=self.save_image(f'posts/old{i}.png', size),
+            )
+            for i, size in enumerate(sizes)
+        ]
+        lost = Post.objects.create(
+            text='Без файла', author=self.author, image='posts/lost.png'
+        )
+        Post.objects.create(text='Без картинки', author=self.author)
+        out = StringIO()
+        call_command('backfill_image_sizes', chunk_size=2, stdout=out)
+        self.assertIn('Записаны размеры картинок: 3', out.getvalue())
+        self.assertIn('не удалось прочитать: 1', out.getvalue())
+        stored = {
+            post.id: (post.image_width, post.image_height, post.image_portrait)
+            for post in Post.objects.exclude(image='')
+        }
+        for post, (width, height) in zip(posts, sizes):
+            self.assertEqual(
+                stored[post.id], (width, height, height > width)
+            )
+        self.assertEqual(stored[lost.id], (None, None, False))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ReclaimMediaTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def legacy_file(self, name, content):
+        """Файл, загруженный по имени, как до хранилища по содержимому."""
+        path = default_storage.save(name, ContentFile(content))
+        self.assertEqual(path, name)
+        return name
+
+    def setUp(self):
+        self.addCleanup(
+            shutil.rmtree, os.path.join(TEMP_MEDIA_ROOT, 'posts'), True
+        )
+        names = [
+            self.legacy_file('posts/a.png', b'same picture'),
+            self.legacy_file('posts/b.png', b'same picture'),
+            self.legacy_file('posts/c.png', b'other picture'),
+        ]
+        self.orphan = self.legacy_file('posts/orphan.png', b'orphan')
+        self.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=self.author, image=name
+            )
+            for i, name in enumerate(names)
+        ]
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command('reclaim_media', dry_run=True, grace=0, stdout=out)
+        self.assertIn('Можно освободить: 18 байт.', out.getvalue())
+        self.assertTrue(default_storage.exists('posts/b.png'))
+        self.assertTrue(default_storage.exists(self.orphan))
+
+    def test_reclaim(self):
+        """Дубликаты сливаются, брошенные файлы удаляются."""
+        out = StringIO()
+        call_command('reclaim_media', grace=0, stdout=out)
+        self.assertIn('Дубликатов: 1 (12 байт)', out.getvalue())
+        self.assertIn('без постов: 1 (6 байт)', out.getvalue())
+        names = [
+            Post.objects.get(id=post.id).image.name for post in self.posts
+        ]
+        self.assertEqual(names[0], names[1])
+        self.assertNotEqual(names[0], names[2])
+        for name in ('posts/a.png', 'posts/b.png', 'posts/c.png',
+                     self.orphan):
+            self.assertFalse(default_storage.exists(name))
+        for name in names:
+            self.assertTrue(default_storage.exists(name))
+        self.assertEqual(
+            dict(ImageBlob.objects.values_list('name', 'refs')),
+            {names[0]: 2, names[2]: 1}
+        )
+
+    def test_reclaim_rebuilds_variants(self):
+        """Варианты картинок, сменивших имя, строятся заново."""
+        PostImageVariant.objects.bulk_create([
+            PostImageVariant(
+                post=post, source=post.image.name, format='webp',
+                width=320, height=160, name=f'cache/{post.id}.webp',
+            )
+            for post in self.posts
+        ])
+        out = StringIO()
+        with mock.patch.object(thumbnails, 'get_thumbnail', FakeThumbnail):
+            call_command('reclaim_media', grace=0, stdout=out)
+        self.assertIn('Картинок с новыми вариантами: 2.', out.getvalue())
+        for post in self.posts:
+            post.refresh_from_db()
+            self.assertEqual(
+                set(post.image_variants.values_list('source', flat=True)),
+                {post.image.name}
+            )
@@ -1,15 +1,20 @@
 import shutil
 import tempfile
+from io import BytesIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import F
 from django.shortcuts import get_object_or_404
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
-from ..models import Comment, Group, Post
+from ..forms import PostForm
+from ..models import Comment, Group, ImageBlob, Post
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -51,6 +56,8 @@ class CommentCreateFormTests(TestCase):
         }))
         self.assertEqual(Comment.objects.count(), comments_count + 1)
         self.assertEqual(last_comment_in_database.text, form_data['text'])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, comments_count + 1)
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -139,8 +146,55 @@ class PostCreateFormTests(TestCase):
             'image': uploaded,
         }
         self.create_post_test_helper(form_data)
+        self.assertRegex(
+            Post.objects.latest('pub_date').image.name,
+            r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$'
+        )
+
+    def test_create_post_stores_image_size(self):
+        """Размеры и ориентация картинки записываются при загрузке."""
+        file_obj = BytesIO()
+        Image.new('RGB', (30, 60)).save(file_obj, 'png')
+        uploaded = SimpleUploadedFile(
+            name='tall.png',
+            content=file_obj.getvalue(),
+            content_type='image/png'
+        )
+        self.create_post_test_helper({
+            'text': 'текст с высокой картинкой',
+            'image': uploaded,
+        })
+        post = Post.objects.latest('pub_date')
+        self.assertEqual((post.image_width, post.image_height), (30, 60))
+        self.assertTrue(post.image_portrait)
+
+    def test_identical_images_share_file(self):
+        """Одинаковые картинки хранятся одним файлом со счётчиком ссылок."""
+        def upload(name, color):
+            file_obj = BytesIO()
+            Image.new('RGB', (10, 10), color).save(file_obj, 'png')
+            return SimpleUploadedFile(
+                name=name, content=file_obj.getvalue(),
+                content_type='image/png'
+            )
+        posts = [
+            Post.objects.create(
+                text=f'Репост {i}', author=self.author,
+                image=upload(name, 'red'),
+            )
+            for i, name in enumerate(('first.png', 'second.png'))
+        ]
+        shared = posts[0].image.name
+        self.assertEqual(posts[1].image.name, shared)
+        self.assertEqual(ImageBlob.objects.get(name=shared).refs, 2)
+        posts[0].delete()
+        self.assertEqual(ImageBlob.objects.get(name=shared).refs, 1)
+        posts[1].image = upload('other.png', 'blue')
+        posts[1].save()
+        self.assertNotEqual(posts[1].image.name, shared)
+        self.assertEqual(ImageBlob.objects.get(name=shared).refs, 0)
         self.assertEqual(
-            Post.objects.latest('pub_date').image, 'posts/small.gif'
+            ImageBlob.objects.get(name=posts[1].image.name).refs, 1
         )
 
     def edit_post_test_helper(self, form_data):
@@ -168,6 +222,23 @@ class PostCreateFormTests(TestCase):
         }
         self.edit_post_test_helper(form_data)
 
+    def test_edit_keeps_concurrent_counters(self):
+        """Лайки и комментарии, пришедшие во время правки, не теряются."""
+        save = PostForm.save
+
+        def save_after_like(form, commit=True):
+            Post.objects.filter(id=self.post.id).update(
+                like_count=F('like_count') + 1,
+                comment_count=F('comment_count') + 1,
+            )
+            return save(form, commit)
+
+        with mock.patch.object(PostForm, 'save', save_after_like):
+            self.edit_post_test_helper({'text': 'текст 6'})
+        post = Post.objects.get(id=self.post.id)
+        self.assertEqual(post.like_count, 1)
+        self.assertEqual(post.comment_count, 1)
+
     def test_edit_post_with_group(self):
         """Изменение поста с группой работает корректно."""
         form_data = {
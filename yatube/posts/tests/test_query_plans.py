@@ -0,0 +1,185 @@
+import re
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Like, Post
+
+User = get_user_model()
+EXPLAINED = ('SELECT', 'UPDATE', 'DELETE')
+STEP = re.compile(
+    r'^(SCAN|SEARCH) (?:TABLE )?(\w+)(?: AS \w+)?'
+    r'(?: USING (?:COVERING )?INDEX \w+| VIRTUAL TABLE.*)?'
+)
+SORT = 'USE TEMP B-TREE FOR ORDER BY'
+# Таблицы, которые читаются целиком намеренно: их размер ограничен
+FULL_SCAN_ALLOWED = {
+    # Справочник групп для формы поста и индекса подсказок
+    'posts_group',
+    # Служебный запрос к схеме при поиске
+    'sqlite_master',
+    # Пронумерованные записи лент при обрезке: уже отобраны по индексу
+    # (user, -pub_date), не больше TIMELINE_MAX_LENGTH + 1 на читателя
+    'ranked',
+}
+# Запросы, которым сортировка во временном дереве допустима: она идёт
+# по уже отобранным и ограниченным строкам
+SORT_ALLOWED = {
+    # Варианты картинок постов одной страницы
+    'posts_postimagevariant',
+    # Совпадения полнотекстового поиска по рангу
+    'posts_post_fts',
+    # Лента лайков: порядок задан полем поста, а не лайка
+    'posts_like',
+    'sqlite_master',
+}
+
+
+@contextmanager
+def capture_statements():
+    statements = []
+
+    def capture(execute, sql, params, many, context):
+        statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(capture):
+        yield statements
+
+
+def plan_problems(plan):
+    """Полный проход по таблице или сортировка всех отобранных строк."""
+    steps = [
+        (line, step) for line, step in zip(plan, map(STEP.match, plan))
+        if step
+    ]
+    problems = []
+    for line, step in steps:
+        if step.group(1) != 'SCAN' or 'VIRTUAL' in line:
+            continue
+        if 'USING' in line and SORT in plan:
+            # Индекс прочитан целиком и всё равно отсортирован заново
+            problems.append(f'{line} + {SORT}')
+        elif 'USING' not in line and step.group(2) not in FULL_SCAN_ALLOWED:
+            problems.append(line)
+    first_table = steps[0][1].group(2) if steps else None
+    if SORT in plan and not problems and first_table not in SORT_ALLOWED:
+        problems.append(f'{first_table}: {SORT}')
+    return problems
+
+
+def full_scans(statements):
+    """Проблемные планы запросов: строка плана и сам запрос."""
+    found = []
+    with connection.cursor() as cursor:
+        for sql, params in statements:
+            if not sql.lstrip().upper().startswith(EXPLAINED):
+                continue
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+            found += [f'{problem}: {sql}' for problem in plan_problems(plan)]
+    return found
+
+
+class QueryPlanTest(TestCase):
+    """Ни один запрос представлений posts.views не читает таблицу
+    целиком: ленты, фильтры и сортировки обслуживаются индексами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание',
+            creator=cls.author,
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост номер {i}', author=cls.author,
+                group=cls.group if i % 2 else None,
+            )
+            for i in range(15)
+        ]
+        cls.post = cls.posts[-1]
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for post in cls.posts[:12]:
+            Like.objects.create(user=cls.reader, post=post)
+            Comment.objects.create(
+                post=post, author=cls.reader, text='Комментарий'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def tearDown(self):
+        cache.clear()
+
+    def assert_no_full_scans(self, method, url, data=None):
+        with capture_statements() as statements:
+            response = getattr(self.client, method)(url, data or {})
+        self.assertLess(response.status_code, 400, url)
+        self.assertTrue(statements, url)
+        self.assertEqual(full_scans(statements), [], url)
+
+    def test_read_views(self):
+        """Ленты, страницы поста, профиля и группы, поиск."""
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:index') + '?page=2',
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:profile', kwargs={'username': 'author'})
+            + '?page=2',
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+            reverse('posts:like_index'),
+            reverse('posts:most_popular_index'),
+            reverse('posts:most_popular_index') + '?period=day',
+            reverse('posts:search_results') + '?q=номер',
+            reverse('posts:search_results') + '?q=auth&type=authors',
+            reverse('posts:typeahead') + '?q=a',
+        ]
+        for url in pages:
+            with self.subTest(url=url):
+                self.assert_no_full_scans('get', url)
+
+    def test_anonymous_pages(self):
+        """Страницы для анонимного читателя."""
+        self.client.logout()
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ):
+            with self.subTest(url=url):
+                self.assert_no_full_scans('get', url)
+
+    def test_write_views(self):
+        """Публикация, правка, комментарий, подписка и лайки."""
+        post_id = {'post_id': self.post.id}
+        author = {'username': 'author'}
+        writes = [
+            ('get', reverse('posts:post_create'), None),
+            ('post', reverse('posts:post_create'), {'text': 'Новый пост'}),
+            ('post', reverse('posts:add_comment', kwargs=post_id),
+             {'text': 'Ещё комментарий'}),
+            ('get', reverse('posts:profile_unfollow', kwargs=author), None),
+            ('get', reverse('posts:profile_follow', kwargs=author), None),
+            ('get', reverse('posts:unlike', kwargs=post_id), None),
+            ('get', reverse('posts:like', kwargs=post_id), None),
+            ('get', reverse('posts:group_create'), None),
+        ]
+        for method, url, data in writes:
+            with self.subTest(url=url, method=method):
+                self.assert_no_full_scans(method, url, data)
+        self.client.force_login(self.author)
+        edit = reverse('posts:post_edit', kwargs=post_id)
+        self.assert_no_full_scans('get', edit)
+        self.assert_no_full_scans('post', edit, {'text': 'Правка'})
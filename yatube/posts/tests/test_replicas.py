@@ -0,0 +1,77 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TransactionTestCase
+from django.urls import reverse
+
+from core import routers
+from ..models import Post
+
+User = get_user_model()
+
+
+@mock.patch('core.routers.DATABASE_REPLICAS', ['replica'])
+class ReplicaReadsTest(TransactionTestCase):
+    """Реплика — вторая база SQLite, которую обновляет sync_replica."""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.old_post = Post.objects.create(
+            text='Пост, который есть на реплике', author=self.author
+        )
+        call_command('sync_replica', database=['replica'], stdout=StringIO())
+        self.new_post = Post.objects.create(
+            text='Пост, которого реплика ещё не видит', author=self.author
+        )
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_read_views_use_replica(self):
+        """Страницы, которые только читают, читают с реплики."""
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:search_results') + '?q=пост',
+        ]
+        for url in pages:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                # В выдаче поиска слово «пост» подсвечено
+                self.assertContains(response, 'который есть на реплике')
+                self.assertNotContains(response, 'реплика ещё не видит')
+        response = self.client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.new_post.id}
+        ))
+        self.assertEqual(response.status_code, 404)
+
+    def test_writer_reads_own_writes(self):
+        """После записи автор читает с default и видит её сразу."""
+        self.client.get(reverse('posts:index'))
+        response = self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.new_post.id}),
+            data={'text': 'Комментарий'},
+        )
+        self.assertIn(routers.PRIMARY_COOKIE, response.cookies)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, self.new_post.text)
+        response = self.client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.new_post.id}
+        ))
+        self.assertContains(response, 'Комментарий')
+
+    def test_writes_go_to_default(self):
+        """Запись из страницы, читающей с реплики, идёт в default."""
+        with routers.use_replica():
+            Post.objects.create(text='Запись', author=self.author)
+            self.assertFalse(Post.objects.filter(text='Запись').exists())
+        self.assertTrue(Post.objects.filter(text='Запись').exists())
@@ -0,0 +1,294 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from contextlib import closing
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import (Client, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+
+from .. import caching, thumbnails, workers
+from ..models import Post, PostImageVariant
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+PLACEHOLDER = 'Картинка обрабатывается'
+
+
+class RecordingExecutor(thumbnails.InlineExecutor):
+    """Пул в текущем процессе, который запоминает задачи."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, function, *args):
+        self.submitted.append(args)
+        return super().submit(function, *args)
+
+
+def run_on_commit(callback):
+    callback()
+
+
+class FakeThumbnail:
+    """Результат sorl без Pillow: проверяется конвейер, а не sorl."""
+
+    SOURCE_WIDTH = 800
+
+    def __init__(self, name, geometry, format, **options):
+        self.width = min(int(geometry), self.SOURCE_WIDTH)
+        self.height = self.width // 2
+        self.name = f'cache/{self.width}.{format.lower()}'
+
+    def exists(self):
+        return True
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+        self.pool = RecordingExecutor()
+        patchers = [
+            mock.patch.object(thumbnails, 'executor', lambda: self.pool),
+            mock.patch.object(thumbnails, 'get_thumbnail', FakeThumbnail),
+            mock.patch.object(
+                thumbnails.transaction, 'on_commit', run_on_commit
+            ),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        cache.clear()
+
+    def create_post(self):
+        self.client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'
+            ),
+        })
+        return Post.objects.latest('id')
+
+    def test_create_builds_variants(self):
+        """Создание поста строит варианты, и страница отдаёт srcset."""
+        post = self.create_post()
+        self.assertEqual(
+            [post_id for post_id, _ in self.pool.submitted], [post.id]
+        )
+        self.assertTrue(post.image_processed)
+        self.assertEqual(
+            set(post.image_variants.values_list('format', 'width')),
+            {
+                (image_format, width)
+                for image_format in ('webp', 'jpeg')
+                for width in (320, 640, 800)
+            }
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertContains(
+            response,
+            'srcset="/media/cache/320.webp 320w, /media/cache/640.webp 640w, '
+            '/media/cache/800.webp 800w"'
+        )
+        self.assertContains(response, 'src="/media/cache/800.jpeg"')
+        self.assertNotContains(response, PLACEHOLDER)
+
+    def test_variants_refresh_cached_cards(self):
+        """Карточка с заглушкой перерисовывается, когда варианты готовы."""
+        with mock.patch.object(thumbnails, 'submit') as submit:
+            self.create_post()
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, PLACEHOLDER)
+        thumbnails.submit(*submit.call_args[0])
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, PLACEHOLDER)
+        self.assertContains(response, 'type="image/webp"')
+
+    def test_new_image_replaces_variants(self):
+        """Варианты прежней картинки не показываются после её замены."""
+        post = self.create_post()
+        with mock.patch.object(thumbnails, 'submit') as submit:
+            self.client.post(
+                reverse('posts:post_edit', kwargs={'post_id': post.id}),
+                data={
+                    'text': 'Новая картинка',
+                    'image': SimpleUploadedFile(
+                        'other.gif',
+                        SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\xFF\x00\x00'),
+                        content_type='image/gif'
+                    ),
+                },
+            )
+            response = self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.id})
+            )
+        self.assertContains(response, PLACEHOLDER)
+        thumbnails.submit(*submit.call_args[0])
+        post.refresh_from_db()
+        self.assertEqual(
+            set(post.image_variants.values_list('source', flat=True)),
+            {post.image.name}
+        )
+
+    def test_duplicate_shares_variants(self):
+        """Повтор той же картинки получает готовые варианты, не строя их."""
+        with mock.patch.object(
+            thumbnails, 'build_variants', wraps=thumbnails.build_variants
+        ) as build_variants:
+            first = self.create_post()
+            second = self.create_post()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(build_variants.call_count, 1)
+        self.assertEqual(
+            set(second.image_variants.values_list('name', flat=True)),
+            set(first.image_variants.values_list('name', flat=True)),
+        )
+
+    def test_render_never_resizes(self):
+        """Пока вариантов нет, страница рисуется с заглушкой, без Pillow
+        и без задач для пула: чтение ничего не пишет."""
+        post = Post.objects.create(
+            text='Старый пост', author=self.author, image='posts/old.gif'
+        )
+        with mock.patch.object(thumbnails, 'submit') as submit, \
+                mock.patch.object(thumbnails, 'get_thumbnail') as thumbnail:
+            response = self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.id})
+            )
+        self.assertContains(response, PLACEHOLDER)
+        thumbnail.assert_not_called()
+        submit.assert_not_called()
+
+    def test_command_builds_legacy_variants(self):
+        """Команда строит варианты картинок, загруженных раньше, и
+        пропускает посты, у которых они уже есть."""
+        post = Post.objects.create(
+            text='Старый пост', author=self.author, image='posts/old.gif'
+        )
+        out = StringIO()
+        call_command('build_image_variants', stdout=out)
+        self.assertIn(
+            'Картинок отдано пулу: 1, с ошибкой: 0.', out.getvalue()
+        )
+        self.assertEqual(post.image_variants.count(), 6)
+        call_command('build_image_variants', stdout=StringIO())
+        self.assertEqual(len(self.pool.submitted), 1)
+
+    def test_task_is_submitted_once(self):
+        """Пока задача в работе, повторная постановка её не дублирует."""
+        post = Post.objects.create(
+            text='Старый пост', author=self.author, image='posts/old.gif'
+        )
+        names = caching.post_versions(post)
+        with mock.patch.object(thumbnails, 'process'), \
+                mock.patch.object(thumbnails, 'finished'):
+            for _ in range(3):
+                thumbnails.submit(post.id, post.image.name, names)
+        self.assertEqual(len(self.pool.submitted), 1)
+
+    def test_feed_does_no_image_io(self):
+        """Лента с картинками рисуется без чтения файлов картинок."""
+        for i in range(3):
+            Post.objects.create(
+                text=f'Пост {i}', author=self.author, image=f'posts/{i}.gif'
+            )
+        with mock.patch.object(thumbnails, 'submit'), \
+                mock.patch('django.core.files.images.get_image_dimensions') \
+                as get_image_dimensions:
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
+        get_image_dimensions.assert_not_called()
+
+
+class InlineBuildTest(SimpleTestCase):
+    def test_tests_do_not_start_pool(self):
+        """Тесты считают варианты в своём процессе: базу в памяти процесс
+        пула не видит."""
+        self.assertIsInstance(
+            thumbnails.executor(), thumbnails.InlineExecutor
+        )
+
+
+@override_settings(IMAGE_BUILD_INLINE=False)
+class ProcessPoolTest(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        author = User.objects.create_user(username='author')
+        donor = Post.objects.create(
+            text='Первый', author=author, image='posts/same.gif'
+        )
+        PostImageVariant.objects.bulk_create([
+            PostImageVariant(
+                post=donor, source='posts/same.gif', format=image_format,
+                width=320, height=160, name=f'cache/320.{image_format}',
+            )
+            for image_format in ('webp', 'jpeg')
+        ])
+        self.post = Post.objects.create(
+            text='Второй', author=author, image='posts/same.gif'
+        )
+
+    def copy_database(self):
+        """Тестовая база в памяти процессу пула не видна: он работает с
+        её копией в файле."""
+        path = os.path.join(self.directory, 'db.sqlite3')
+        connection.ensure_connection()
+        with closing(sqlite3.connect(path)) as target:
+            connection.connection.backup(target)
+        return path
+
+    def test_spawned_worker_runs_task(self):
+        """Настоящий пул (spawn) запускает задачу из модуля workers."""
+        names = {'default': self.copy_database()}
+        with mock.patch.object(thumbnails, '_executor', None), \
+                mock.patch.object(thumbnails, 'database_names') as databases:
+            databases.return_value = names
+            pool = thumbnails.executor()
+            try:
+                result = pool.submit(
+                    workers.process, self.post.id, 'posts/same.gif'
+                ).result(timeout=60)
+            finally:
+                pool.shutdown()
+        self.assertEqual(result, 0)
+        with closing(sqlite3.connect(names['default'])) as database:
+            copied = database.execute(
+                'SELECT COUNT(*) FROM posts_postimagevariant '
+                'WHERE post_id = ?', (self.post.id,)
+            ).fetchone()[0]
+        self.assertEqual(copied, 2)
@@ -0,0 +1,139 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import uploads
+from ..models import ImageBlob, Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+# Тег EXIF с поворотом и тег с моделью камеры
+ORIENTATION = 0x0112
+CAMERA_MODEL = 0x0110
+
+
+def jpeg_with_exif(size=(40, 20)):
+    exif = Image.Exif()
+    exif[ORIENTATION] = 6
+    exif[CAMERA_MODEL] = 'Камера автора'
+    file_obj = BytesIO()
+    Image.new('RGB', size, 'red').save(file_obj, 'jpeg', exif=exif)
+    return file_obj.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SanitizeTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, content, filename='photo.jpg'):
+        post = Post.objects.create(
+            text='Пост с фотографией', author=self.author,
+            image=ContentFile(content, name=filename),
+            image_processed=False,
+        )
+        return post, post.image.name
+
+    def test_sanitize_strips_metadata(self):
+        """Очистка поворачивает картинку по EXIF и удаляет метаданные."""
+        post, name = self.create_post(jpeg_with_exif())
+        clean = uploads.sanitize(post.id, name)
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, clean)
+        self.assertNotEqual(clean, name)
+        self.assertTrue(post.image_processed)
+        self.assertEqual((post.image_width, post.image_height), (20, 40))
+        self.assertTrue(post.image_portrait)
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (20, 40))
+            self.assertEqual(dict(image.getexif()), {})
+        self.assertEqual(ImageBlob.objects.get(name=clean).refs, 1)
+        self.assertEqual(ImageBlob.objects.get(name=name).refs, 0)
+
+    def test_broken_image_is_removed(self):
+        """Картинка, которую не удалось декодировать, снимается с поста."""
+        content = jpeg_with_exif()
+        post, name = self.create_post(content[:len(content) // 2])
+        self.assertIsNone(uploads.sanitize(post.id, name))
+        post.refresh_from_db()
+        self.assertFalse(post.image)
+        self.assertTrue(post.image_processed)
+        self.assertEqual(ImageBlob.objects.get(name=name).refs, 0)
+
+    def test_replaced_image_is_kept(self):
+        """Очистка устаревшей картинки не трогает новую картинку поста."""
+        post, name = self.create_post(jpeg_with_exif())
+        post.image = ContentFile(jpeg_with_exif((10, 10)), name='new.jpg')
+        post.save()
+        self.assertIsNone(uploads.sanitize(post.id, name))
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, name)
+        self.assertFalse(post.image_processed)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class UploadLimitsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def tearDown(self):
+        cache.clear()
+
+    def create_post(self, content):
+        return self.client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с фотографией',
+            'image': SimpleUploadedFile(
+                'photo.jpg', content, content_type='image/jpeg'
+            ),
+        })
+
+    def test_upload_waits_for_sanitizing(self):
+        """Новая загрузка сохраняется неочищенной и ждёт пула."""
+        self.create_post(jpeg_with_exif())
+        self.assertFalse(Post.objects.get().image_processed)
+
+    def test_too_many_pixels_rejected(self):
+        """Картинка больше предела пикселей отклоняется по заголовку."""
+        with mock.patch.object(uploads, 'IMAGE_MAX_PIXELS', 100):
+            response = self.create_post(jpeg_with_exif())
+        self.assertFormError(
+            response, 'form', 'image',
+            'Картинка 40×20 слишком велика: не больше 100 пикселей.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    def test_too_large_upload_rejected(self):
+        """Загрузка больше предела обрывается, и пост не создаётся."""
+        with mock.patch('core.uploadhandlers.UPLOAD_MAX_BYTES', 100):
+            response = self.create_post(jpeg_with_exif())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors['image'])
+        self.assertFalse(Post.objects.exists())
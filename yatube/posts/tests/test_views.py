@@ -1,17 +1,32 @@
 import datetime
 import shutil
 import tempfile
+from io import StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from yatube.settings import NUM_OF_POSTS_ON_PAGE
+from django.utils import timezone
+from django.utils.timezone import utc
+from yatube.settings import (NUM_OF_POSTS_ON_PAGE, TYPEAHEAD_LIMIT,
+                             TYPEAHEAD_MAX_AGE)
 
-from ..models import Comment, Follow, Group, Post
+from .. import caching, feeds, search
+from ..feeds import follow_feed
+from ..models import (AuthorSearchTerm, Comment, Follow, FollowerCount,
+                      Group, Like, Post, PostScore, TimelineEntry)
+from ..typeahead import typeahead
+from ..utils import CursorPaginator, viewer_state_on_page
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -132,7 +147,7 @@ class PostPagesTests(TestCase):
                 'text': self.post_in_group_1.text,
                 'group': self.group_1,
                 'id': self.post_in_group_1.id,
-                'image': 'posts/small.gif',
+                'image': self.post_in_group_1.image.name,
             },
             {
                 'author': self.user_author,
@@ -144,16 +159,23 @@ class PostPagesTests(TestCase):
         self.check_context(list_post_fields, posts_on_page)
 
     def test_cache_index(self):
-        """Главная страница кэшируется"""
+        """Главная страница кэшируется до смены версии ленты"""
         response_1 = self.authorized_client.get(reverse('posts:index'))
-        deleted_post = Post.objects.get(id=self.post.id)
-        deleted_post.delete()
+        Post.objects.filter(id=self.post.id).update(text='Без сигналов')
         response_2 = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(response_1.content, response_2.content)
         cache.clear()
         response_3 = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(response_1.content, response_3.content)
 
+    def test_cache_index_invalidated_on_delete(self):
+        """Удаление поста сразу обновляет главную страницу"""
+        response_1 = self.authorized_client.get(reverse('posts:index'))
+        deleted_post = Post.objects.get(id=self.post.id)
+        deleted_post.delete()
+        response_2 = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotEqual(response_1.content, response_2.content)
+
     def test_profile_show_correct_context(self):
         """Шаблон profile сформирован с правильным контекстом"""
         response = self.authorized_client.get(reverse(
@@ -177,7 +199,7 @@ class PostPagesTests(TestCase):
                 'text': self.post_in_group_1.text,
                 'group': self.group_1,
                 'id': self.post_in_group_1.id,
-                'image': 'posts/small.gif',
+                'image': self.post_in_group_1.image.name,
             },
             {
                 'author': self.user_author,
@@ -204,7 +226,7 @@ class PostPagesTests(TestCase):
                 'text': self.post_in_group_1.text,
                 'group': self.group_1,
                 'id': self.post_in_group_1.id,
-                'image': 'posts/small.gif',
+                'image': self.post_in_group_1.image.name,
             },
         ]
         self.check_context(list_post_fields, posts_on_page)
@@ -240,7 +262,7 @@ class PostPagesTests(TestCase):
                 'text': self.post_in_group_1.text,
                 'group': self.group_1,
                 'id': self.post_in_group_1.id,
-                'image': 'posts/small.gif',
+                'image': self.post_in_group_1.image.name,
             }
         ]
         self.check_context(post_fields, post)
@@ -430,3 +452,846 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(
                     len(response.context['page_obj']), num_of_post_on_page_2
                 )
+
+    def test_cursor_pages_do_not_overlap(self):
+        """Переход по курсорам выдаёт страницы без пропусков и повторов"""
+        response = self.client.get(reverse('posts:index'))
+        page_1 = response.context['page_obj']
+        next_cursor = page_1.paginator.next_cursor
+        self.assertIsNotNone(next_cursor)
+        response = self.client.get(
+            reverse('posts:index'), {'page': 2, 'cursor': next_cursor}
+        )
+        page_2 = response.context['page_obj']
+        self.assertEqual(page_2.number, 2)
+        self.assertFalse(page_2.has_next())
+        seen = [post.id for post in page_1] + [post.id for post in page_2]
+        self.assertEqual(len(seen), self.NUM_OF_POSTS_IN_TEST)
+        self.assertEqual(len(set(seen)), self.NUM_OF_POSTS_IN_TEST)
+        self.assertIsNone(page_2.paginator.previous_cursor)
+
+    def test_cursor_walks_back_and_forth(self):
+        """Курсоры «вперёд» и «назад» возвращают те же страницы"""
+        posts = Post.objects.all()
+        pages = [CursorPaginator(posts, 3).get_page(1)]
+        while pages[-1].has_next():
+            paginator = pages[-1].paginator
+            pages.append(CursorPaginator(posts, 3).get_page(
+                pages[-1].next_page_number(), paginator.next_cursor
+            ))
+        self.assertEqual(len(pages), 5)
+        last = pages[-1]
+        previous = CursorPaginator(posts, 3).get_page(
+            last.previous_page_number(), last.paginator.previous_cursor
+        )
+        self.assertEqual(list(previous), list(pages[-2]))
+        number, cursor = last.paginator.page_window[0]
+        self.assertEqual(number, 3)
+        jumped = CursorPaginator(posts, 3).get_page(number, cursor)
+        self.assertEqual(list(jumped), list(pages[2]))
+
+    def test_cursor_keyset_survives_new_posts(self):
+        """Новые посты не сдвигают следующую страницу по курсору"""
+        response = self.client.get(reverse('posts:index'))
+        page_1 = response.context['page_obj']
+        next_cursor = page_1.paginator.next_cursor
+        Post.objects.create(text='Свежий пост', author=self.user)
+        response = self.client.get(
+            reverse('posts:index'), {'page': 2, 'cursor': next_cursor}
+        )
+        page_2 = response.context['page_obj']
+        self.assertFalse(set(page_1) & set(page_2))
+        self.assertEqual(
+            len(page_2), self.NUM_OF_POSTS_IN_TEST - NUM_OF_POSTS_ON_PAGE
+        )
+
+    def test_broken_cursor_falls_back_to_page_number(self):
+        """Испорченный курсор не ломает страницу"""
+        response = self.client.get(
+            reverse('posts:index'), {'page': 2, 'cursor': 'broken'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(response.context['page_obj']),
+            self.NUM_OF_POSTS_IN_TEST - NUM_OF_POSTS_ON_PAGE
+        )
+
+    def test_page_window_is_bounded(self):
+        """Навигация выводит только окно соседних страниц"""
+        response = self.client.get(reverse('posts:index'))
+        numbers = [
+            number for number, cursor
+            in response.context['page_obj'].paginator.page_window
+        ]
+        self.assertEqual(numbers, [1, 2])
+
+
+class LikeViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='liker')
+        cls.user_author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            text='Пост, который лайкают',
+            author=cls.user_author,
+        )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_like_and_unlike_keep_like_count(self):
+        """Лайк и его отмена атомарно меняют like_count поста."""
+        url_like = reverse('posts:like', kwargs={'post_id': self.post.id})
+        url_unlike = reverse('posts:unlike', kwargs={'post_id': self.post.id})
+        response = self.authorized_client.get(url_like)
+        self.assertEqual(response.json(), 1)
+        response = self.authorized_client.get(url_like)
+        self.assertEqual(response.json(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        response = self.authorized_client.get(url_unlike)
+        self.assertEqual(response.json(), 0)
+        response = self.authorized_client.get(url_unlike)
+        self.assertEqual(response.json(), 0)
+        self.assertFalse(Like.objects.filter(post=self.post).exists())
+
+    def delete_post_queries(self, fans):
+        post = Post.objects.create(text='Удаляемый', author=self.user_author)
+        for number in range(fans):
+            fan = User.objects.create_user(username=f'fan{fans}_{number}')
+            Like.objects.create(user=fan, post=post)
+            Comment.objects.create(post=post, author=fan, text='Ура')
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+        return len(queries)
+
+    def test_post_cascade_does_not_load_post_per_row(self):
+        """Каскад лайков и комментариев удалённого поста не читает пост
+        на каждую строку."""
+        self.assertEqual(
+            self.delete_post_queries(1), self.delete_post_queries(4)
+        )
+
+    def test_deleted_liker_releases_like(self):
+        """Удаление лайкнувшего пользователя снимает его лайк с поста."""
+        fan = User.objects.create_user(username='fan')
+        Like.objects.create(user=fan, post=self.post)
+        Comment.objects.create(post=self.post, author=fan, text='Ура')
+        fan.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(
+            (self.post.like_count, self.post.comment_count), (0, 0)
+        )
+
+
+class ViewerStateTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='viewer')
+        cls.user_author = User.objects.create_user(username='author')
+        cls.another_author = User.objects.create_user(username='another')
+        cls.liked_post = Post.objects.create(
+            text='Понравившийся пост', author=cls.user_author
+        )
+        cls.commented_post = Post.objects.create(
+            text='Прокомментированный пост', author=cls.another_author
+        )
+        Like.objects.create(user=cls.user, post=cls.liked_post)
+        Comment.objects.create(
+            post=cls.commented_post, author=cls.user, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.user, author=cls.user_author)
+
+    def test_viewer_state_in_one_query(self):
+        """Состояние зрителя для страницы собирается одним запросом."""
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(1):
+            viewer_state_on_page(posts, self.user)
+        state = {
+            post.id: (post.is_like, post.is_commented, post.is_following)
+            for post in posts
+        }
+        self.assertEqual(state, {
+            self.liked_post.id: (True, False, True),
+            self.commented_post.id: (False, True, False),
+        })
+
+    def test_viewer_state_anonymous_without_queries(self):
+        """Для анонима состояние заполняется без запросов к базе."""
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(0):
+            viewer_state_on_page(posts, AnonymousUser())
+        self.assertFalse(any(post.is_like for post in posts))
+
+    def test_warm_fragment_skips_feed_query(self):
+        """Если фрагмент ленты в кэше, посты из базы не читаются."""
+        client = Client()
+        client.force_login(self.user)
+        cold = client.get(reverse('posts:index'))
+        with CaptureQueriesContext(connection) as queries:
+            warm = client.get(reverse('posts:index'))
+        self.assertFalse(any(
+            'posts_post' in query['sql'] for query in queries.captured_queries
+        ))
+        self.assertEqual(cold.content, warm.content)
+        with self.assertNumQueries(3):
+            client.get(reverse('posts:index'))
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.user_author = User.objects.create_user(username='author')
+        cls.another_author = User.objects.create_user(username='another')
+
+    def test_delete_author_with_followers(self):
+        """Автора с подписчиками можно удалить: счётчик не уходит в минус."""
+        author = User.objects.create_user(username='leaving_author')
+        Follow.objects.create(user=self.user, author=author)
+        Follow.objects.create(user=self.another_author, author=author)
+        author.delete()
+        self.assertFalse(FollowerCount.objects.filter(
+            author_id=author.id
+        ).exists())
+
+    def test_delete_follower(self):
+        """Удаление подписчика уменьшает счётчик автора."""
+        follower = User.objects.create_user(username='leaving_follower')
+        Follow.objects.create(user=self.user, author=self.user_author)
+        Follow.objects.create(user=follower, author=self.user_author)
+        follower.delete()
+        self.assertEqual(
+            FollowerCount.objects.get(author=self.user_author).count, 1
+        )
+
+    def test_fan_out_and_prune(self):
+        """Пост попадает в ленты подписчиков и пропадает после отписки."""
+        Follow.objects.create(user=self.user, author=self.user_author)
+        post = Post.objects.create(text='Новый пост', author=self.user_author)
+        Post.objects.create(text='Чужой пост', author=self.another_author)
+        self.assertEqual(
+            list(self.user.timeline.values_list('post', flat=True)),
+            [post.id]
+        )
+        Follow.objects.get(user=self.user, author=self.user_author).delete()
+        self.assertFalse(self.user.timeline.exists())
+
+    def test_backfill_on_follow(self):
+        """После подписки лента заполняется уже вышедшими постами автора."""
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.another_author)
+            for i in range(3)
+        ]
+        Follow.objects.create(user=self.user, author=self.another_author)
+        self.assertEqual(
+            set(self.user.timeline.values_list('post', flat=True)),
+            {post.id for post in posts}
+        )
+
+    def test_timeline_is_capped(self):
+        """Лента хранит не больше TIMELINE_MAX_LENGTH свежих записей."""
+        Follow.objects.create(user=self.user, author=self.user_author)
+        with mock.patch('posts.feeds.TIMELINE_MAX_LENGTH', 3):
+            posts = [
+                Post.objects.create(text=f'Пост {i}', author=self.user_author)
+                for i in range(5)
+            ]
+        self.assertEqual(
+            set(self.user.timeline.values_list('post', flat=True)),
+            {post.id for post in posts[-3:]}
+        )
+
+    def test_timelines_trimmed_in_one_statement(self):
+        """Ленты всех подписчиков обрезаются одной командой DELETE."""
+        readers = [
+            User.objects.create_user(username=f'reader{i}') for i in range(3)
+        ]
+        for reader in readers:
+            Follow.objects.create(user=reader, author=self.user_author)
+        with mock.patch('posts.feeds.TIMELINE_MAX_LENGTH', 2):
+            posts = [
+                Post.objects.create(text=f'Пост {i}', author=self.user_author)
+                for i in range(3)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                feeds.trim_timelines([reader.id for reader in readers])
+        self.assertEqual(len(queries), 1)
+        for reader in readers:
+            self.assertEqual(
+                set(reader.timeline.values_list('post', flat=True)),
+                {post.id for post in posts[-2:]}
+            )
+
+    def test_follow_index_reads_timeline(self):
+        """Лента подписок читается из материализованной ленты и не делает
+        join по подпискам: один запрос за «звёздами», один за страницей."""
+        Follow.objects.create(user=self.user, author=self.user_author)
+        Post.objects.create(text='Пост', author=self.user_author)
+        request = RequestFactory().get(reverse('posts:follow_index'))
+        with self.assertNumQueries(2):
+            page_obj = follow_feed(self.user, request)
+        self.assertEqual(page_obj[0].author, self.user_author)
+
+    def test_celebrity_posts_are_pulled(self):
+        """Посты «звёзд» не раскладываются, а подмешиваются при чтении."""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.user, author=self.user_author)
+        Follow.objects.create(user=self.user, author=self.another_author)
+        Follow.objects.create(user=fan, author=self.another_author)
+        posts = [Post.objects.create(
+            text='Пост до славы', author=self.another_author
+        )]
+        with mock.patch('posts.feeds.FEED_CELEBRITY_THRESHOLD', 2):
+            for i in range(12):
+                author = self.another_author if i % 2 else self.user_author
+                posts.append(
+                    Post.objects.create(text=f'Пост {i}', author=author)
+                )
+            for i, post in enumerate(posts):
+                post.pub_date = datetime.datetime(2021, 1, 1 + i, tzinfo=utc)
+                post.save()
+            self.assertEqual(TimelineEntry.objects.filter(
+                user=self.user, author=self.another_author
+            ).count(), 1)
+            request = RequestFactory().get(reverse('posts:follow_index'))
+            page_1 = follow_feed(self.user, request)
+            request = RequestFactory().get(reverse('posts:follow_index'), {
+                'page': 2, 'cursor': page_1.paginator.next_cursor
+            })
+            page_2 = follow_feed(self.user, request)
+        seen = [post.id for post in page_1] + [post.id for post in page_2]
+        self.assertEqual(seen, [post.id for post in reversed(posts)])
+
+    def test_rebuild_timelines(self):
+        """Команда восстанавливает ленты по существующим подпискам."""
+        Follow.objects.create(user=self.user, author=self.user_author)
+        post = Post.objects.create(text='Пост', author=self.user_author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(
+            list(self.user.timeline.values_list('post', flat=True)),
+            [post.id]
+        )
+
+
+class PopularViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_author = User.objects.create_user(username='author')
+        cls.readers = [
+            User.objects.create_user(username=f'reader{i}') for i in range(3)
+        ]
+        cls.old_post = Post.objects.create(
+            text='Старый популярный пост', author=cls.user_author
+        )
+        cls.old_post.pub_date = timezone.now() - datetime.timedelta(days=30)
+        cls.old_post.save()
+        cls.new_post = Post.objects.create(
+            text='Свежий пост', author=cls.user_author
+        )
+        for reader in cls.readers:
+            Like.objects.create(user=reader, post=cls.old_post)
+        Like.objects.create(user=cls.readers[0], post=cls.new_post)
+
+    def get_posts(self, period):
+        response = self.client.get(
+            reverse('posts:most_popular_index'), {'period': period}
+        )
+        return list(response.context['page_obj'])
+
+    def test_like_updates_ranking_store(self):
+        """Лайк сразу обновляет счётчики, рейтинг и окна."""
+        self.old_post.refresh_from_db()
+        self.assertEqual(self.old_post.like_count, 3)
+        self.assertEqual(
+            PostScore.objects.get(post=self.old_post, period='week').score, 3
+        )
+        Like.objects.filter(post=self.old_post).first().delete()
+        self.assertEqual(
+            PostScore.objects.get(post=self.old_post, period='day').score, 2
+        )
+
+    def test_all_time_and_windows(self):
+        """Окно «неделя» не учитывает лайки старше недели."""
+        self.assertEqual(
+            self.get_posts('all'), [self.old_post, self.new_post]
+        )
+        Like.objects.filter(post=self.old_post).update(
+            created=timezone.now() - datetime.timedelta(days=10)
+        )
+        call_command('refresh_post_scores', hot=True, stdout=StringIO())
+        self.assertEqual(self.get_posts('week'), [self.new_post])
+        self.assertEqual(self.get_posts('day'), [self.new_post])
+
+    def test_hot_prefers_fresh_posts(self):
+        """Горячие: свежий пост обгоняет старый с большим числом лайков."""
+        self.assertEqual(
+            self.get_posts('hot'), [self.new_post, self.old_post]
+        )
+
+    def test_hot_score_written_with_insert(self):
+        """Рейтинг нового поста пишется вставкой, без UPDATE после неё."""
+        with CaptureQueriesContext(connection) as queries:
+            post = Post.objects.create(
+                text='Ещё пост', author=self.user_author
+            )
+        self.assertFalse(any(
+            query['sql'].startswith('UPDATE "posts_post"')
+            for query in queries
+        ))
+        post.refresh_from_db()
+        self.old_post.refresh_from_db()
+        self.assertGreater(post.hot_score, self.old_post.hot_score)
+
+    def test_popular_page_is_indexed_read(self):
+        """Страница популярного не агрегирует лайки при каждом запросе."""
+        with CaptureQueriesContext(connection) as queries:
+            self.get_posts('all')
+        self.assertFalse(any(
+            'COUNT(' in query['sql'].upper() for query in queries
+        ))
+
+
+class SearchViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_author = User.objects.create_user(username='author')
+        cls.cheese = Post.objects.create(
+            text='Сыры бывают твёрдые и мягкие, а этот пост про сыр.',
+            author=cls.user_author,
+        )
+        cls.tree = Post.objects.create(
+            text='Ёлка зелёная стоит во дворе', author=cls.user_author
+        )
+        cls.once = Post.objects.create(
+            text='Один раз упомянутый сыр <b>жирный</b> и ещё много '
+                 'других слов, которые размывают релевантность поста',
+            author=cls.user_author,
+        )
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search_results'), {'q': query, **params}
+        )
+        return response.context['page_obj']
+
+    def test_search_uses_fts_ranking(self):
+        """Поиск находит словоформы и ранжирует по BM25."""
+        self.assertTrue(search.fts_available())
+        found = list(self.search('сыры'))
+        self.assertEqual(found, [self.cheese, self.once])
+
+    def test_search_yo_and_highlight(self):
+        """«е» находит «ё», совпадения подсвечены в настоящем тексте
+        поста, HTML экранирован."""
+        found = list(self.search('елка'))
+        self.assertEqual(found, [self.tree])
+        self.assertEqual(
+            found[0].highlighted, '<mark>Ёлка</mark> зелёная стоит во дворе'
+        )
+        found = list(self.search('жирный'))
+        self.assertIn('<mark>', found[0].highlighted)
+        self.assertIn('&lt;b&gt;', found[0].highlighted)
+        self.assertIn('ещё много других слов', found[0].highlighted)
+
+    def test_search_index_follows_edits(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        tree = Post.objects.get(id=self.tree.id)
+        tree.text = 'Сосна'
+        tree.save()
+        self.assertEqual(list(self.search('елка')), [])
+        self.assertEqual(list(self.search('сосна')), [tree])
+        tree.delete()
+        self.assertEqual(list(self.search('сосна')), [])
+
+    def test_post_migrate_restores_triggers(self):
+        """Триггеры, потерянные при пересборке posts_post, ставятся
+        заново после migrate."""
+        with connection.cursor() as cursor:
+            for action in ('insert', 'update', 'delete'):
+                cursor.execute(
+                    f'DROP TRIGGER {search.FTS_TABLE}_{action}'
+                )
+        emit_post_migrate_signal(0, False, 'default')
+        post = Post.objects.create(text='Груша', author=self.user_author)
+        self.assertEqual(list(self.search('груша')), [post])
+
+    def test_search_pages_by_cursor(self):
+        """Выдача листается курсором без повторов."""
+        for i in range(12):
+            Post.objects.create(text=f'Сыр номер {i}', author=self.user_author)
+        page_1 = self.search('сыр')
+        page_2 = self.search(
+            'сыр', page=2, cursor=page_1.paginator.next_cursor
+        )
+        ids = [post.id for post in page_1] + [post.id for post in page_2]
+        self.assertEqual(len(ids), 14)
+        self.assertEqual(len(set(ids)), 14)
+
+    def test_search_without_fts(self):
+        """Без FTS5 поиск откатывается на LIKE."""
+        with mock.patch('posts.search.fts_available', return_value=False):
+            found = list(self.search('Ёлка'))
+        self.assertEqual(found, [self.tree])
+
+
+class AuthorSearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.ivan = User.objects.create_user(username='ivan')
+        cls.ivanov = User.objects.create_user(
+            username='ivanov_petr', first_name='Пётр', last_name='Иванов'
+        )
+        cls.maria = User.objects.create_user(
+            username='maria', first_name='Мария', last_name='Иванова'
+        )
+        cls.sivan = User.objects.create_user(username='xsivanx')
+
+    def search(self, query):
+        response = self.client.get(
+            reverse('posts:search_results'), {'q': query, 'type': 'authors'}
+        )
+        return list(response.context['page_obj'])
+
+    def test_exact_username_first(self):
+        """Точный псевдоним, затем префикс, имя и подстрока."""
+        self.assertEqual(
+            self.search('IVAN'), [self.ivan, self.ivanov, self.sivan]
+        )
+        self.assertEqual(self.search('иван'), [self.ivanov, self.maria])
+
+    def test_name_prefix_and_yo(self):
+        """Имя ищется по префиксу без учёта регистра и «ё»."""
+        self.assertEqual(self.search('петр'), [self.ivanov])
+        self.assertEqual(self.search('иванова'), [self.maria])
+
+    def test_index_follows_profile_changes(self):
+        """Индекс обновляется при регистрации и смене профиля."""
+        user = User.objects.create_user(username='newbie')
+        self.assertEqual(self.search('newb'), [user])
+        user.first_name = 'Зоя'
+        user.save()
+        self.assertEqual(self.search('зоя'), [user])
+        user.username = 'renamed'
+        user.save()
+        self.assertEqual(self.search('newb'), [])
+
+    def test_truncated_groups_are_reported(self):
+        """Обрезанная группа совпадений видна на странице поиска."""
+        response = self.client.get(
+            reverse('posts:search_results'), {'q': 'ivan', 'type': 'authors'}
+        )
+        self.assertIsNone(response.context['page_obj'].search_limit)
+        with mock.patch('posts.search.AUTHOR_SEARCH_LIMIT', 1):
+            response = self.client.get(
+                reverse('posts:search_results'),
+                {'q': 'ivan', 'type': 'authors'}
+            )
+        self.assertEqual(response.context['page_obj'].search_limit, 1)
+        self.assertContains(response, 'Показаны не все совпадения')
+
+    def test_rebuild_command(self):
+        """Команда заново заполняет индекс по существующим пользователям."""
+        AuthorSearchTerm.objects.all().delete()
+        self.assertEqual(self.search('maria'), [])
+        call_command('rebuild_author_index', stdout=StringIO())
+        self.assertEqual(self.search('maria'), [self.maria])
+
+
+class TypeaheadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Alice')
+        cls.group = Group.objects.create(
+            title='Ёжики', slug='hedgehogs', description='Про ежей'
+        )
+
+    def setUp(self):
+        typeahead.reset()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def tearDown(self):
+        typeahead.reset()
+
+    def suggest(self, query, **params):
+        response = self.client.get(
+            reverse('posts:typeahead'), {'q': query, **params}
+        )
+        return response.json()
+
+    def test_completes_users_and_groups(self):
+        """Подсказки по префиксу псевдонима, названия и slug группы."""
+        self.assertEqual(
+            self.suggest('al'),
+            {'users': [{'username': 'Alice'}], 'groups': []}
+        )
+        group = {'title': 'Ёжики', 'slug': 'hedgehogs'}
+        self.assertEqual(self.suggest('ежи')['groups'], [group])
+        self.assertEqual(self.suggest('hedge')['groups'], [group])
+        self.assertEqual(self.suggest(''), {'users': [], 'groups': []})
+
+    def test_no_queries_after_load(self):
+        """После загрузки индекса подсказки не обращаются к базе."""
+        self.suggest('a')
+        with self.assertNumQueries(0):
+            self.suggest('al')
+
+    def test_limit(self):
+        for i in range(TYPEAHEAD_LIMIT + 2):
+            User.objects.create_user(username=f'alpha{i}')
+        self.assertEqual(len(self.suggest('al')['users']), TYPEAHEAD_LIMIT)
+        self.assertEqual(len(self.suggest('al', limit=2)['users']), 2)
+
+    def test_index_updated_on_signup_and_group_create(self):
+        """Регистрация и создание группы сразу попадают в подсказки."""
+        self.suggest('a')
+        self.client.post(reverse('users:signup'), {
+            'username': 'bob',
+            'password1': 'Sup3r-secret-pass',
+            'password2': 'Sup3r-secret-pass',
+        })
+        self.authorized_client.post(reverse('posts:group_create'), {
+            'title': 'Бобры', 'slug': 'beavers', 'description': 'Про бобров'
+        })
+        with self.assertNumQueries(0):
+            found = self.suggest('b')
+        self.assertEqual(found['users'], [{'username': 'bob'}])
+        self.assertEqual(
+            found['groups'], [{'title': 'Бобры', 'slug': 'beavers'}]
+        )
+
+    def test_refresh_outside_lock(self):
+        """Устаревший индекс перечитывается без общей блокировки, а
+        регистрация во время чтения попадает и в новый индекс."""
+        self.suggest('a')
+        typeahead.loaded_at -= TYPEAHEAD_MAX_AGE + 1
+        load = typeahead.load
+
+        def load_during_signup():
+            indexes = load()
+            self.assertFalse(typeahead.lock.locked())
+            User.objects.create_user(username='bella')
+            return indexes
+
+        with mock.patch.object(typeahead, 'load', load_during_signup):
+            self.suggest('a')
+        self.assertFalse(typeahead.stale())
+        self.assertEqual(self.suggest('be')['users'], [{'username': 'bella'}])
+
+
+class FeedCacheVersionTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая', slug='other', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Текст поста', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def versions(self, *names):
+        return caching.get_versions(names)
+
+    def test_post_events_bump_its_feeds(self):
+        """Правка поста меняет версии его лент, но не чужих."""
+        feeds = (
+            caching.INDEX, caching.POPULAR, caching.group_feed('group'),
+            caching.group_feed('other'), caching.profile_feed('writer'),
+            caching.profile_feed('reader'),
+        )
+        before = self.versions(*feeds)
+        post = Post.objects.get(id=self.post.id)
+        post.group = self.other_group
+        post.save()
+        after = self.versions(*feeds)
+        changed = [old != new for old, new in zip(before, after)]
+        self.assertEqual(changed, [True, True, True, True, True, False])
+
+    def test_like_and_comment_refresh_pages(self):
+        """Лайк и комментарий сразу видны на страницах группы и автора."""
+        urls = (
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'writer'}),
+            reverse('posts:most_popular_index'),
+        )
+        for url in urls:
+            self.assertContains(self.client.get(url), 'Комментариев: 0')
+        Comment.objects.create(post=self.post, author=self.reader, text='!')
+        for url in urls:
+            self.assertContains(self.client.get(url), 'Комментариев: 1')
+        Like.objects.create(post=self.post, user=self.reader)
+        for url in urls:
+            self.assertRegex(
+                self.client.get(url).content.decode(),
+                rf'id="like_{self.post.id}">\s*1\s*<',
+            )
+
+    def test_evicted_version_does_not_revive_fragments(self):
+        """Вытесненная версия не начинается заново с прежнего значения."""
+        before, = self.versions(caching.INDEX)
+        cache.delete(caching.VERSION_PREFIX + caching.INDEX)
+        after, = self.versions(caching.INDEX)
+        self.assertNotEqual(before, after)
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост про сыр {i}', author=cls.author, group=cls.group
+            )
+            for i in range(NUM_OF_POSTS_ON_PAGE)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_warm_cards_need_no_per_post_queries(self):
+        """На тёплом кэше карточки не запрашивают авторов постов."""
+        url = reverse('posts:group_list', kwargs={'slug': 'group'})
+        self.client.get(url)
+        caching.bump(caching.group_feed('group'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertFalse(
+            [q for q in queries.captured_queries if 'auth_user' in q['sql']]
+        )
+
+    def test_like_hole_is_per_viewer(self):
+        """Общий фрагмент ленты показывает каждому его собственные лайки."""
+        post = self.posts[-1]
+        Like.objects.create(post=post, user=self.reader)
+        other = Client()
+        other.force_login(self.author)
+        url = reverse('posts:index')
+        self.assertContains(self.client.get(url), '💙')
+        self.assertContains(self.reader_client.get(url), '❤', count=1)
+        self.assertNotContains(other.get(url), '❤')
+        self.assertContains(self.reader_client.get(url), '❤', count=1)
+
+    def test_cards_shared_with_search_highlight(self):
+        """Карточка из кэша ленты показывает в поиске свою подсветку."""
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(
+            reverse('posts:search_results'), {'q': 'сыр'}
+        )
+        self.assertContains(response, '<mark>')
+        self.assertContains(response, '<hr>', count=NUM_OF_POSTS_ON_PAGE - 1)
+
+    def test_card_follows_post_version(self):
+        """Правка поста меняет его карточку во всех лентах."""
+        url = reverse('posts:like_index')
+        post = Post.objects.get(id=self.posts[0].id)
+        Like.objects.create(post=post, user=self.reader)
+        self.assertRegex(
+            self.reader_client.get(url).content.decode(),
+            rf'id="like_{post.id}">\s*1\s*<',
+        )
+        Like.objects.create(post=post, user=self.author)
+        self.assertRegex(
+            self.reader_client.get(url).content.decode(),
+            rf'id="like_{post.id}">\s*2\s*<',
+        )
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Первый пост', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'writer'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+
+    def test_repeat_request_without_database(self):
+        """Повторный анонимный запрос и 304 не обращаются к базе."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(first.content, second.content)
+                with self.assertNumQueries(0):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=first['ETag']
+                    )
+                self.assertEqual(response.status_code, 304)
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_new_post_refreshes_pages(self):
+        """Новый пост меняет ETag и содержимое затронутых страниц."""
+        etags = [self.client.get(url)['ETag'] for url in self.urls[:3]]
+        Post.objects.create(
+            text='Второй пост', author=self.author, group=self.group
+        )
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Второй пост')
+
+    def test_comment_refreshes_post_detail(self):
+        url = self.urls[3]
+        self.client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Новый комментарий'
+        )
+        self.assertContains(self.client.get(url), 'Новый комментарий')
+
+    def test_varies_by_query_and_skips_logged_in(self):
+        """Страницы с разными параметрами и вошедшие читатели — отдельно."""
+        url = self.urls[0]
+        self.client.get(url)
+        response = self.client.get(url, {'page': 2})
+        self.assertEqual(response.context['page_obj'].number, 2)
+        response = self.authorized_client.get(url)
+        self.assertNotIn('ETag', response)
+        self.assertIsNotNone(response.context)
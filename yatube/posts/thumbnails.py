@@ -0,0 +1,232 @@
+"""Варианты картинок постов считаются в пуле процессов.
+
+Запрос только ставит задачу, а шаблон до её выполнения показывает
+заглушку: Pillow никогда не работает в потоке, отвечающем читателю.
+Новую загрузку задача сначала очищает (см. uploads), затем строит
+картинку нескольких ширин в WebP и JPEG и записывает их в
+PostImageVariant; когда она выполнена, версии поста и его лент
+сдвигаются, и карточки перерисовываются уже с картинкой.
+"""
+import hashlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.default import kvstore
+from yatube.settings import (IMAGE_TASK_LEASE, IMAGE_VARIANT_QUALITY,
+                             IMAGE_VARIANT_WIDTHS, IMAGE_WORKERS)
+
+from . import caching, uploads, workers
+from .models import Post, PostImageVariant
+
+PENDING_PREFIX = 'thumbnail_pending:'
+# Форматы вариантов и их имена для sorl
+FORMATS = (
+    (PostImageVariant.WEBP, 'WEBP'),
+    (PostImageVariant.JPEG, 'JPEG'),
+)
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def database_names():
+    return {
+        alias: connections[alias].settings_dict['NAME']
+        for alias in connections
+    }
+
+
+class InlineExecutor:
+    """Пул, выполняющий задачу сразу в текущем процессе."""
+
+    def submit(self, function, *args):
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+
+def executor():
+    """Пул процессов. Они запускаются с чистого листа (spawn), не
+    наследуют соединения с базой родителя и получают задачи через
+    модуль workers, который можно импортировать до django.setup().
+
+    С IMAGE_BUILD_INLINE задачи выполняются в текущем процессе.
+    """
+    if settings.IMAGE_BUILD_INLINE:
+        return InlineExecutor()
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=workers.setup_worker,
+                initargs=(database_names(),),
+            )
+        return _executor
+
+
+def reset_executor():
+    """Отбрасывает пул, если процесс в нём упал: следующий создастся заново."""
+    global _executor
+    with _executor_lock:
+        broken, _executor = _executor, None
+    if broken is not None:
+        broken.shutdown(wait=False)
+
+
+def image_key(prefix, name):
+    return prefix + hashlib.md5(name.encode()).hexdigest()
+
+
+def process(post_id, name):
+    """Выполняется в процессе пула (через workers.process): очищает
+    новую загрузку и строит варианты картинки поста."""
+    processed = Post.objects.filter(id=post_id, image=name).values_list(
+        'image_processed', flat=True
+    ).first()
+    if processed is None:
+        # Пост удалён или картинку уже заменили: задача устарела
+        return 0
+    if not processed:
+        name = uploads.sanitize(post_id, name)
+        if name is None:
+            return 0
+    if share_variants(post_id, name):
+        return 0
+    with uploads.time_limit():
+        return build_variants(post_id, name)
+
+
+def build_variants(post_id, name):
+    """Строит варианты средствами sorl и заменяет ими прежние варианты
+    поста."""
+    # Все варианты одной картинки проверяются по хранилищу метаданных
+    # одной пачкой
+    kvstore.preload([name])
+    variants = {}
+    for image_format, engine_format in FORMATS:
+        for width in IMAGE_VARIANT_WIDTHS:
+            thumbnail = get_thumbnail(
+                name, str(width), format=engine_format,
+                quality=IMAGE_VARIANT_QUALITY, upscale=False,
+            )
+            if not thumbnail.exists():
+                raise ValueError(f'Не удалось построить вариант {name}')
+            # Картинка уже узкой ширины даёт одинаковые варианты
+            variants[image_format, thumbnail.width] = PostImageVariant(
+                post_id=post_id, source=name, format=image_format,
+                width=thumbnail.width, height=thumbnail.height,
+                name=thumbnail.name,
+            )
+    with transaction.atomic():
+        PostImageVariant.objects.filter(post_id=post_id).delete()
+        PostImageVariant.objects.bulk_create(variants.values())
+    return len(variants)
+
+
+def finished(name, names, future):
+    try:
+        future.result()
+    except Exception:
+        logger.exception('Варианты картинки %s не построены', name)
+    else:
+        caching.bump(*names)
+    cache.delete(image_key(PENDING_PREFIX, name))
+
+
+def share_variants(post_id, name):
+    """Копирует варианты той же картинки у другого поста: в хранилище по
+    содержимому у дубликатов одно имя файла, и строить заново нечего."""
+    donor = PostImageVariant.objects.filter(source=name).exclude(
+        post_id=post_id
+    ).values_list('post_id', flat=True).first()
+    if donor is None:
+        return False
+    copies = [
+        PostImageVariant(
+            post_id=post_id, source=name, format=variant.format,
+            width=variant.width, height=variant.height, name=variant.name,
+        )
+        for variant in PostImageVariant.objects.filter(
+            post_id=donor, source=name
+        )
+    ]
+    with transaction.atomic():
+        PostImageVariant.objects.filter(post_id=post_id).delete()
+        PostImageVariant.objects.bulk_create(copies)
+    return True
+
+
+def submit(post_id, name, names):
+    """Отдаёт картинку пулу, если её варианты ещё не построены для
+    дубликата и не в работе. Возвращает future задачи или None."""
+    if share_variants(post_id, name):
+        caching.bump(*names)
+        return None
+    if not cache.add(image_key(PENDING_PREFIX, name), True, IMAGE_TASK_LEASE):
+        return None
+    try:
+        future = executor().submit(workers.process, post_id, name)
+    except BrokenProcessPool:
+        reset_executor()
+        future = executor().submit(workers.process, post_id, name)
+    future.add_done_callback(partial(finished, name, names))
+    return future
+
+
+def enqueue(post):
+    """Ставит варианты картинки поста в очередь, когда транзакция
+    зафиксирована: процесс пула должен увидеть пост и файл картинки."""
+    if post.image:
+        transaction.on_commit(partial(
+            submit, post.id, post.image.name, caching.post_versions(post)
+        ))
+
+
+def srcset(variants):
+    return ', '.join(
+        f'{variant.url} {variant.width}w' for variant in variants
+    )
+
+
+def ready_variants(post):
+    """Варианты картинки поста для шаблона или None, если их ещё нет.
+
+    Читает только таблицу вариантов: с prefetch_related — без запросов.
+    Ничего не пишет и задач не ставит: страница может читаться с
+    реплики. Варианты строятся при загрузке, а для картинок,
+    загруженных раньше, — командой build_image_variants.
+    """
+    if not post.image:
+        return None
+    by_format = {}
+    for variant in post.image_variants.all():
+        if variant.source == post.image.name:
+            variant.url = default_storage.url(variant.name)
+            by_format.setdefault(variant.format, []).append(variant)
+    if not by_format:
+        return None
+    webp = by_format.get(PostImageVariant.WEBP, [])
+    fallback = by_format.get(PostImageVariant.JPEG) or webp
+    return {
+        'src': fallback[-1].url,
+        'width': fallback[-1].width,
+        'height': fallback[-1].height,
+        'srcset': srcset(fallback),
+        'webp_srcset': srcset(webp),
+    }
@@ -0,0 +1,167 @@
+import bisect
+import threading
+import time
+
+from yatube.settings import TYPEAHEAD_LIMIT, TYPEAHEAD_MAX_AGE
+
+from .models import Group, User
+from .search import normalize_term
+
+
+class PrefixIndex:
+    """Отсортированный массив пар (ключ, id) с поиском префикса bisect'ом.
+
+    Префиксу соответствует непрерывный отрезок массива, поэтому
+    подсказка стоит один двоичный поиск и чтение limit соседних пар.
+    Полный индекс строится из троек (id, ключи, данные) одной
+    сортировкой; set и discard меняют его по одному элементу.
+    """
+
+    def __init__(self, entries=()):
+        self.keys = []
+        self.items = {}
+        for item_id, keys, payload in entries:
+            keys = self.normalize(keys)
+            self.keys.extend((key, item_id) for key in keys)
+            self.items[item_id] = (keys, payload)
+        self.keys.sort()
+
+    @staticmethod
+    def normalize(keys):
+        return sorted({normalize_term(key) for key in keys if key})
+
+    def set(self, item_id, keys, payload):
+        self.discard(item_id)
+        keys = self.normalize(keys)
+        for key in keys:
+            bisect.insort(self.keys, (key, item_id))
+        self.items[item_id] = (keys, payload)
+
+    def discard(self, item_id):
+        keys, _ = self.items.pop(item_id, ((), None))
+        for key in keys:
+            i = bisect.bisect_left(self.keys, (key, item_id))
+            if i < len(self.keys) and self.keys[i] == (key, item_id):
+                del self.keys[i]
+
+    def complete(self, prefix, limit):
+        found = []
+        i = bisect.bisect_left(self.keys, (prefix,))
+        while i < len(self.keys) and len(found) < limit:
+            key, item_id = self.keys[i]
+            if not key.startswith(prefix):
+                break
+            if item_id not in found:
+                found.append(item_id)
+            i += 1
+        return [self.items[item_id][1] for item_id in found]
+
+
+class Typeahead:
+    """Подсказки по псевдонимам и группам из памяти процесса.
+
+    Индекс загружается из базы при первом обращении и дальше
+    обновляется сигналами сохранения и удаления. Раз в
+    TYPEAHEAD_MAX_AGE секунд он перечитывается целиком, чтобы
+    подхватить изменения, сделанные в других процессах. Перечитывает
+    один запрос и без общей блокировки: остальные тем временем
+    подсказывают по старому индексу, новый подменяет его целиком.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.users = None
+        self.groups = None
+        self.loaded_at = None
+        # Изменения от сигналов, пришедшие, пока индекс перечитывается
+        self.changes = None
+
+    def load(self):
+        users = PrefixIndex(
+            (user_id, [username], {'username': username})
+            for user_id, username in User.objects.values_list(
+                'id', 'username'
+            )
+        )
+        groups = PrefixIndex(
+            (group_id, [title, slug], {'title': title, 'slug': slug})
+            for group_id, title, slug in Group.objects.values_list(
+                'id', 'title', 'slug'
+            )
+        )
+        return users, groups
+
+    def refresh(self):
+        with self.lock:
+            self.changes = []
+        try:
+            users, groups = self.load()
+            with self.lock:
+                for change in self.changes:
+                    change(users, groups)
+                self.users, self.groups = users, groups
+                self.loaded_at = time.monotonic()
+        finally:
+            with self.lock:
+                self.changes = None
+
+    def stale(self):
+        return (
+            self.loaded_at is None
+            or time.monotonic() - self.loaded_at > TYPEAHEAD_MAX_AGE
+        )
+
+    def ensure_loaded(self):
+        if not self.stale():
+            return
+        # Первую загрузку ждут все, устаревший индекс перечитывает один
+        if not self.refresh_lock.acquire(blocking=self.users is None):
+            return
+        try:
+            if self.stale():
+                self.refresh()
+        finally:
+            self.refresh_lock.release()
+
+    def complete(self, prefix, limit=TYPEAHEAD_LIMIT):
+        prefix = normalize_term(prefix.strip())
+        if not prefix:
+            return {'users': [], 'groups': []}
+        self.ensure_loaded()
+        with self.lock:
+            return {
+                'users': self.users.complete(prefix, limit),
+                'groups': self.groups.complete(prefix, limit),
+            }
+
+    def apply(self, change):
+        with self.lock:
+            if self.users is not None:
+                change(self.users, self.groups)
+            if self.changes is not None:
+                self.changes.append(change)
+
+    def add_user(self, user):
+        self.apply(lambda users, groups: users.set(
+            user.id, [user.username], {'username': user.username}
+        ))
+
+    def remove_user(self, user):
+        self.apply(lambda users, groups: users.discard(user.id))
+
+    def add_group(self, group):
+        self.apply(lambda users, groups: groups.set(
+            group.id,
+            [group.title, group.slug],
+            {'title': group.title, 'slug': group.slug},
+        ))
+
+    def remove_group(self, group):
+        self.apply(lambda users, groups: groups.discard(group.id))
+
+
+typeahead = Typeahead()
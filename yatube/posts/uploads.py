@@ -0,0 +1,145 @@
+"""Проверка и очистка загруженных картинок.
+
+В запросе картинка проверяется дёшево: по заголовку, без декодирования
+пикселей. Полное декодирование, поворот по EXIF, удаление метаданных и
+перекодирование выполняет процесс пула с ограничением памяти и времени,
+уже после того, как пост создан.
+"""
+import os
+import signal
+import threading
+from contextlib import contextmanager
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+from yatube.settings import (IMAGE_MAX_PIXELS, IMAGE_TASK_TIMEOUT,
+                             IMAGE_UPLOAD_QUALITY, IMAGE_WORKER_MEMORY)
+
+from . import blobs
+from .models import Post
+
+EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'GIF': '.gif',
+    'WEBP': '.webp',
+}
+# Форматы, у которых поворот хранится в EXIF
+EXIF_FORMATS = ('JPEG', 'WEBP')
+
+
+class ImageRejected(Exception):
+    """Картинку нельзя принять: формат не тот или пикселей слишком много."""
+
+
+def check_header(image):
+    """Дешёвая проверка в запросе: формат и число пикселей по заголовку."""
+    if image.format not in EXTENSIONS:
+        raise ImageRejected(f'Формат {image.format} не поддерживается.')
+    width, height = image.size
+    if width * height > IMAGE_MAX_PIXELS:
+        raise ImageRejected(
+            f'Картинка {width}×{height} слишком велика: не больше '
+            f'{IMAGE_MAX_PIXELS} пикселей.'
+        )
+
+
+def limit_worker_memory():
+    """Ограничивает адресное пространство процесса пула: картинка, которой
+    не хватило памяти, отбрасывается с MemoryError, а не роняет хост."""
+    try:
+        import resource
+    except ImportError:
+        return
+    resource.setrlimit(
+        resource.RLIMIT_AS, (IMAGE_WORKER_MEMORY, IMAGE_WORKER_MEMORY)
+    )
+    Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+
+
+def _timed_out(signum, frame):
+    raise TimeoutError
+
+
+@contextmanager
+def time_limit(seconds=IMAGE_TASK_TIMEOUT):
+    """Прерывает задачу процесса пула по SIGALRM, где он есть.
+
+    Обработчик сигнала ставится только из главного потока: задача,
+    выполненная без пула (IMAGE_BUILD_INLINE), идёт без ограничения.
+    """
+    if (not hasattr(signal, 'SIGALRM')
+            or threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+    previous = signal.signal(signal.SIGALRM, _timed_out)
+    signal.alarm(seconds)
+    try:
+        yield
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def reencode(source):
+    """Полностью декодирует картинку и кодирует заново без метаданных.
+
+    Возвращает (байты, расширение, ширина, высота).
+    """
+    image = Image.open(source)
+    check_header(image)
+    image_format = image.format
+    options = {'format': image_format}
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+    if getattr(image, 'is_animated', False):
+        options['save_all'] = True
+    else:
+        if image_format in EXIF_FORMATS:
+            image = ImageOps.exif_transpose(image)
+        image.load()
+    if image_format == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        options['quality'] = IMAGE_UPLOAD_QUALITY
+    buffer = BytesIO()
+    image.save(buffer, **options)
+    extension = EXTENSIONS[image_format]
+    return buffer.getvalue(), extension, image.width, image.height
+
+
+def sanitize(post_id, name):
+    """Выполняется в процессе пула: заменяет загруженный файл очищенным.
+
+    Возвращает имя очищенного файла или None, если картинка отвергнута
+    и снята с поста или пока шла очистка пост получил другую картинку.
+    """
+    field = Post._meta.get_field('image')
+    try:
+        with time_limit(), field.storage.open(name) as source:
+            content, extension, width, height = reencode(source)
+    except (ImageRejected, OSError, MemoryError, TimeoutError,
+            Image.DecompressionBombError, SyntaxError, ValueError):
+        with transaction.atomic():
+            if Post.objects.filter(id=post_id, image=name).update(
+                image='', image_width=None, image_height=None,
+                image_portrait=False, image_processed=True,
+            ):
+                blobs.release(name)
+        return None
+    clean = field.storage.save(
+        os.path.join(field.upload_to, 'image' + extension),
+        ContentFile(content),
+    )
+    with transaction.atomic():
+        if not Post.objects.filter(id=post_id, image=name).update(
+            image=clean, image_width=width, image_height=height,
+            image_portrait=height > width, image_processed=True,
+        ):
+            # Пока файл очищался, картинку поста заменили
+            return None
+        blobs.retain(clean, len(content))
+        blobs.release(name)
+    return clean
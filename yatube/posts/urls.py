@@ -43,5 +43,6 @@ urlpatterns = [
     ),
 
    path('search/', views.search_results, name='search_results'),
+    path('typeahead/', views.typeahead_suggestions, name='typeahead'),
 
 ]
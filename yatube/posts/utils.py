@@ -1,31 +1,210 @@
-from django.core.paginator import Paginator
-from django.db.models import Count
-from yatube.settings import NUM_OF_POSTS_ON_PAGE
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Page, Paginator
+from django.db.models import Exists, OuterRef, Q
+from django.utils.functional import SimpleLazyObject, empty
+from yatube.settings import NUM_OF_POSTS_ON_PAGE, PAGINATOR_WINDOW
 
-from .models import Post
+from .models import Comment, Follow, Like, Post
 
+CURSOR_SALT = 'posts.cursor'
 
-def paginate(posts, request):
-    paginator = Paginator(posts, NUM_OF_POSTS_ON_PAGE)
+
+class CursorPaginator(Paginator):
+    """Постраничный вывод по ключу сортировки (keyset) вместо OFFSET.
+
+    Страницы адресуются непрозрачным курсором — подписанной позицией
+    первой или последней записи соседней страницы, поэтому выборка любой
+    глубины стоит столько же, сколько первая страница, а COUNT(*) не
+    выполняется вовсе. Все поля ordering должны сортироваться в одном
+    направлении и вместе однозначно задавать порядок записей.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-id'), window=PAGINATOR_WINDOW):
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = self.ordering[0].startswith('-')
+        self.window = window
+        if hasattr(object_list, 'order_by'):
+            object_list = object_list.order_by(*self.ordering)
+        super().__init__(object_list, per_page)
+        self.num_pages = 1
+        self.page_window = []
+        self.previous_cursor = None
+        self.next_cursor = None
+
+    def get_page(self, number, cursor=None):
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        position = self.decode_cursor(cursor)
+        if position is None:
+            backwards, offset = False, (number - 1) * self.per_page
+            rows = self.fetch(None, backwards, offset, self.per_page + 1)
+        else:
+            values, backwards, offset = position
+            rows = self.fetch(values, backwards, offset, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            has_next = True
+            if not has_more:
+                number = 1
+        else:
+            has_next = has_more
+        self.num_pages = number + 1 if has_next else number
+        page = Page(rows, number, self)
+        self._build_links(page, has_next)
+        return page
+
+    def fetch(self, values, backwards, offset, limit):
+        """Возвращает limit записей после позиции values (или с начала)."""
+        return self.slice_of(
+            self.object_list, self.fields, values, backwards, offset, limit
+        )
+
+    def slice_of(self, queryset, fields, values, backwards, offset, limit):
+        """Срез queryset в порядке пагинатора, но по своим полям fields."""
+        sign = '-' if self.descending != backwards else ''
+        queryset = queryset.order_by(*[sign + name for name in fields])
+        if values is not None:
+            queryset = queryset.filter(self.after(values, backwards, fields))
+        return list(queryset[offset:offset + limit])
+
+    def after(self, values, backwards=False, fields=None):
+        """Условие «строго после values» в порядке обхода.
+
+        Первое поле дополнительно ограничено нестрого, чтобы база
+        могла выбрать диапазон по индексу, а не перебирать OR-ветки.
+        """
+        fields = fields or self.fields
+        forward = 'lt' if self.descending else 'gt'
+        backward = 'gt' if self.descending else 'lt'
+        lookup = backward if backwards else forward
+        condition = Q()
+        for i, name in enumerate(fields):
+            step = Q(**{f'{name}__{lookup}': values[i]})
+            for prev_name, prev_value in zip(fields[:i], values[:i]):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        leading = Q(**{f'{fields[0]}__{lookup}e': values[0]})
+        return leading & condition
+
+    def key(self, obj):
+        return [getattr(obj, name) for name in self.fields]
+
+    def encode_cursor(self, obj, backwards=False, offset=0):
+        values = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in self.key(obj)
+        ]
+        return signing.dumps(
+            [values, int(backwards), offset], salt=CURSOR_SALT
+        )
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            values, backwards, offset = signing.loads(
+                cursor, salt=CURSOR_SALT
+            )
+            values = [
+                self.to_python(name, value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        if len(values) != len(self.fields):
+            return None
+        return values, bool(backwards), max(int(offset), 0)
+
+    def to_python(self, name, value):
+        model = getattr(self.object_list, 'model', None)
+        if model is None:
+            return value
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return value
+        return field.to_python(value)
+
+    def _build_links(self, page, has_next):
+        """Ссылки на ограниченное окно соседних страниц."""
+        number = page.number
+        rows = page.object_list
+        self.page_window = []
+        for target in range(max(number - self.window, 1), number):
+            self.page_window.append(
+                (target, self._cursor_back(rows, number, target))
+            )
+        self.page_window.append((number, None))
+        if number > 1:
+            self.previous_cursor = self._cursor_back(rows, number, number - 1)
+        if has_next and rows:
+            self.next_cursor = self.encode_cursor(rows[-1])
+            self.page_window.append((number + 1, self.next_cursor))
+
+    def _cursor_back(self, rows, number, target):
+        if target == 1 or not rows:
+            return None
+        skip = (number - target - 1) * self.per_page
+        return self.encode_cursor(rows[0], backwards=True, offset=skip)
+
+
+def paginate(posts, request, ordering=('-pub_date', '-id')):
+    paginator = CursorPaginator(posts, NUM_OF_POSTS_ON_PAGE, ordering)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    cursor = request.GET.get('cursor')
+    page_obj = paginator.get_page(page_number, cursor)
     return page_obj
 
 
-def annotate(posts):
-    posts = posts.annotate(num_likes=Count('likes')).all()
-    return posts
-
-def likes_on_page(page_obj, user):
-    posts_id = []
-    for post in page_obj:
-        posts_id.append(post.id)
-    liked_posts = Post.objects.filter(
-        likes__user__username=user, likes__post__id__in=posts_id
-    )
-    for post in page_obj:
-        if post in liked_posts:
-            post.is_like = True
-        else:
-            post.is_like = False
+class LazyPage(SimpleLazyObject):
+    """Страница ленты, которая читается из базы при первом обращении.
+
+    Лента рисуется внутри {% cache %}: если фрагмент нашёлся в кэше,
+    страница не нужна, и запросы за постами не выполняются.
+    """
+
+    @property
+    def loaded(self):
+        return self._wrapped is not empty
+
+
+def lazy_feed(page, user):
+    """Ленивая страница: page() строит её, затем отмечается состояние
+    зрителя."""
+    return LazyPage(lambda: viewer_state_on_page(page(), user))
+
+
+def viewer_state_on_page(page_obj, user):
+    """Отмечает, лайкал ли зритель пост, комментировал ли его
+    и подписан ли на автора — одним запросом на всю страницу."""
+    posts = list(page_obj)
+    state = {}
+    if user.is_authenticated and posts:
+        rows = Post.objects.filter(
+            id__in=[post.id for post in posts]
+        ).annotate(
+            viewer_like=Exists(Like.objects.filter(
+                user=user, post=OuterRef('pk')
+            )),
+            viewer_comment=Exists(Comment.objects.filter(
+                author=user, post=OuterRef('pk')
+            )),
+            viewer_follow=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author')
+            )),
+        ).order_by().values_list(
+            'id', 'viewer_like', 'viewer_comment', 'viewer_follow'
+        )
+        state = {post_id: flags for post_id, *flags in rows}
+    for post in posts:
+        (
+            post.is_like, post.is_commented, post.is_following
+        ) = state.get(post.id, (False, False, False))
     return page_obj
@@ -1,44 +1,63 @@
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
+from django.db import transaction
 from django.http.response import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from core.routers import replica_reads, sticks_to_primary
+from core.uploadhandlers import reject_too_large
+from yatube.settings import FRAGMENT_CACHE_TIMEOUT, TYPEAHEAD_LIMIT
 
+from . import caching, search, thumbnails
+from .feeds import follow_feed
 from .forms import CommentForm, GroupForm, PostForm
 from .models import Comment, Follow, Group, Like, Post, User
-from .utils import annotate, likes_on_page, paginate
+from .ranking import ALL_TIME, POPULAR_CHOICES, popular_page
+from .typeahead import typeahead
+from .utils import lazy_feed, paginate, viewer_state_on_page
 
 
+@replica_reads
+@caching.anonymous_page
 def index(request):
     template = 'posts/index.html'
+    fragment = caching.feed_fragment(request, caching.INDEX)
     posts = Post.objects.select_related('author').all()
-    page_obj = paginate(posts, request)
-    page_obj = likes_on_page(page_obj, request.user)
+    page_obj = lazy_feed(lambda: paginate(posts, request), request.user)
     context = {
         'page_obj': page_obj,
+        **fragment,
     }
     return render(request, template, context)
 
 
+@replica_reads
+@caching.anonymous_page
 def group_posts(request, slug):
     template = 'posts/group_list.html'
+    fragment = caching.feed_fragment(request, caching.group_feed(slug))
     group = get_object_or_404(Group, slug=slug)
     posts = Post.objects.select_related('group').filter(group=group)
-    page_obj = paginate(posts, request)
-    page_obj = likes_on_page(page_obj, request.user)
+    page_obj = lazy_feed(lambda: paginate(posts, request), request.user)
     context = {
         'group': group,
         'page_obj': page_obj,
+        **fragment,
     }
     return render(request, template, context)
 
 
+@replica_reads
+@caching.anonymous_page
 def profile(request, username):
     template = 'posts/profile.html'
+    fragment = caching.feed_fragment(request, caching.profile_feed(username))
     author = get_object_or_404(User, username=username)
     posts = Post.objects.select_related('author').filter(author=author)
-    page_obj = paginate(posts, request)
-    page_obj = likes_on_page(page_obj, request.user)
-    posts_count = posts.count()
+    page_obj = lazy_feed(lambda: paginate(posts, request), request.user)
+    version, = caching.depends_on(request, caching.profile_feed(username))
+    posts_count = caching.single_flight(
+        f'posts_count:{username}:{version}', posts.count,
+        FRAGMENT_CACHE_TIMEOUT,
+    )
     user = request.user
     if user.is_authenticated and user != author:
         following = Follow.objects.filter(
@@ -51,23 +70,25 @@ def profile(request, username):
         'page_obj': page_obj,
         'posts_count': posts_count,
         'following': following,
+        **fragment,
     }
     return render(request, template, context)
 
 
+@replica_reads
+@caching.anonymous_page
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
+    caching.depends_on(request, caching.post_version(post_id))
     post = get_object_or_404(Post, id=post_id)
     author = post.author
+    caching.depends_on(request, caching.profile_feed(author.username))
     num_author_posts = Post.objects.filter(author=author).count()
     comment_form = CommentForm(request.POST or None)
     comments = Comment.objects.filter(post=post)
-    likes = Like.objects.filter(post=post).count()
-    now_liker = False
-    if request.user.is_authenticated and Like.objects.filter(
-        post=post, user=request.user
-    ).exists():
-        now_liker = True
+    likes = post.like_count
+    viewer_state_on_page([post], request.user)
+    now_liker = post.is_like
     context = {
         'author': author,
         'post': post,
@@ -81,19 +102,23 @@ def post_detail(request, post_id):
 
 
 @login_required
+@sticks_to_primary
 def post_create(request):
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
     )
+    reject_too_large(request, form)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.enqueue(post)
         return redirect('posts:profile', post.author)
     return render(request, 'posts/post_create.html', {'form': form})
 
 @login_required
+@sticks_to_primary
 def group_create(request):
     form = GroupForm(
         request.POST or None,
@@ -107,6 +132,7 @@ def group_create(request):
     return render(request, 'posts/group_create.html', {'form': form})
 
 @login_required
+@sticks_to_primary
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = PostForm(
@@ -114,6 +140,7 @@ def post_edit(request, post_id):
         files=request.FILES or None,
         instance=post
     )
+    reject_too_large(request, form)
     if not form.is_valid():
         if request.user == post.author:
             template = 'posts/post_create.html'
@@ -123,11 +150,15 @@ def post_edit(request, post_id):
             }
             return render(request, template, context)
         return redirect('posts:post_detail', post.id)
-    post = form.save()
+    post = form.save(commit=False)
+    post.save(update_fields=form.edited_fields())
+    if 'image' in form.changed_data:
+        thumbnails.enqueue(post)
     return redirect('posts:post_detail', post.id)
 
 
 @login_required
+@sticks_to_primary
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -135,7 +166,8 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
@@ -143,23 +175,29 @@ def add_comment(request, post_id):
 def follow_index(request):
     template = 'posts/follow.html'
     user = request.user
-    posts = Post.objects.filter(author__following__user=user)
-    page_obj = paginate(posts, request)
-    page_obj = likes_on_page(page_obj, request.user)
+    page_obj = follow_feed(user, request)
+    page_obj = viewer_state_on_page(page_obj, request.user)
     context = {
         'page_obj': page_obj,
     }
     return render(request, template, context)
 
+@replica_reads
+@caching.anonymous_page
 def most_popular_index(request):
     template = 'posts/most_popular_index.html'
-    posts = Post.objects.all()
-    posts = annotate(posts)
-    posts = posts.order_by('-num_likes', '-pub_date')
-    page_obj = paginate(posts, request)
-    page_obj = likes_on_page(page_obj, request.user)
+    period = request.GET.get('period')
+    if period not in dict(POPULAR_CHOICES):
+        period = ALL_TIME
+    fragment = caching.feed_fragment(request, caching.POPULAR)
+    page_obj = lazy_feed(
+        lambda: popular_page(period, request), request.user
+    )
     context = {
         'page_obj': page_obj,
+        'period': period,
+        'popular_periods': POPULAR_CHOICES,
+        **fragment,
     }
     return render(request, template, context)
 
@@ -169,74 +207,76 @@ def like_index(request):
     user = request.user
     posts = Post.objects.filter(likes__user=user)
     page_obj = paginate(posts, request)
-    page_obj = likes_on_page(page_obj, request.user)
+    page_obj = viewer_state_on_page(page_obj, request.user)
     context = {
         'page_obj': page_obj,
     }
     return render(request, template, context)
 
 @login_required
+@sticks_to_primary
 def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
-    now_follower = Follow.objects.filter(user=user, author=author).exists()
-    if user != author and not now_follower:
-        Follow.objects.create(user=user, author=author)
+    with transaction.atomic():
+        now_follower = Follow.objects.filter(
+            user=user, author=author
+        ).exists()
+        if user != author and not now_follower:
+            Follow.objects.create(user=user, author=author)
     return redirect('posts:profile', username=username)
 
 
 @login_required
+@sticks_to_primary
 def profile_unfollow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
-    now_follower = Follow.objects.filter(user=user, author=author).exists()
-    if now_follower:
-        follow = Follow.objects.get(user=user, author=author)
-        follow.delete()
+    with transaction.atomic():
+        now_follower = Follow.objects.filter(
+            user=user, author=author
+        ).exists()
+        if now_follower:
+            follow = Follow.objects.get(user=user, author=author)
+            follow.delete()
     return redirect('posts:profile', username=username)
 
 
 
 @login_required
+@sticks_to_primary
 def like(request, post_id):
     user = request.user
     post = get_object_or_404(Post, id=post_id)
-    now_liker = Like.objects.filter(user=user, post=post).exists()
-    if not now_liker:
-        Like.objects.create(user=user, post=post)
-    return JsonResponse(Like.objects.filter(post=post).count(), safe=False)
+    with transaction.atomic():
+        Like.objects.get_or_create(user=user, post=post)
+        post.refresh_from_db(fields=('like_count',))
+    return JsonResponse(post.like_count, safe=False)
 
 @login_required
+@sticks_to_primary
 def unlike(request, post_id):
     user = request.user
     post = get_object_or_404(Post, id=post_id)
-    now_liker = Like.objects.filter(user=user, post=post).exists()
-    if now_liker:
-        like = Like.objects.get(user=user, post=post)
-        like.delete()
-    return JsonResponse(Like.objects.filter(post=post).count(), safe=False)
+    with transaction.atomic():
+        Like.objects.filter(user=user, post=post).delete()
+        post.refresh_from_db(fields=('like_count',))
+    return JsonResponse(post.like_count, safe=False)
 
 
 
+@replica_reads
 def search_results(request):
     template = 'posts/search_results.html'
-    query = request.GET.get('q')
+    query = request.GET.get('q', '')
     data_type = request.GET.get('type', 'posts')
-    posts=[]
-    authors=[]
     if data_type == 'authors':
-        authors = User.objects.filter(
-            Q(username__icontains=query) | Q(first_name__icontains=query) | Q(last_name__icontains=query)
-        )
-        page_obj = paginate(authors, request)
+        page_obj = search.search_authors(query, request)
         search_authors = True
         search_posts = False
-    elif data_type == 'posts':   
-        posts = Post.objects.filter(
-            text__icontains=query
-        )
-        page_obj = paginate(posts, request)
-        page_obj = likes_on_page(page_obj, request.user)
+    elif data_type == 'posts':
+        page_obj = search.search_posts(query, request)
+        page_obj = viewer_state_on_page(page_obj, request.user)
         search_authors = False
         search_posts = True
     else:
@@ -250,3 +290,13 @@ def search_results(request):
         'search_posts': search_posts,
     }
     return render(request, template, context)
+
+
+def typeahead_suggestions(request):
+    """Подсказки по префиксу: псевдонимы и группы без запросов к базе."""
+    try:
+        limit = int(request.GET.get('limit', TYPEAHEAD_LIMIT))
+    except ValueError:
+        limit = TYPEAHEAD_LIMIT
+    limit = min(max(limit, 1), TYPEAHEAD_LIMIT)
+    return JsonResponse(typeahead.complete(request.GET.get('q', ''), limit))
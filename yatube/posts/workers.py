@@ -0,0 +1,28 @@
+"""Точки входа процессов пула картинок.
+
+Процесс пула запускается с чистого листа (spawn) и находит
+инициализатор и задачу по имени этого модуля, ещё до django.setup().
+Поэтому модуль не импортирует при загрузке ничего из Django и моделей:
+они нужны только внутри функций, когда Django уже настроен.
+"""
+import os
+
+
+def setup_worker(database_names):
+    """Настраивает Django в процессе пула: те же настройки (через
+    окружение) и те же файлы баз, что у родителя. База SQLite в памяти
+    сюда не передаётся, поэтому тесты строят варианты без пула
+    (IMAGE_BUILD_INLINE)."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    from django.conf import settings
+    for alias, name in database_names.items():
+        settings.DATABASES[alias]['NAME'] = name
+    import django
+    django.setup()
+    from . import uploads
+    uploads.limit_worker_memory()
+
+
+def process(post_id, name):
+    from . import thumbnails
+    return thumbnails.process(post_id, name)
@@ -80,22 +80,60 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Общий для всех процессов сервера кэш в файле SQLite с LRU-кэшем
+# процесса перед ним: инвалидации видны всем процессам сразу
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'L1_MAX_ENTRIES': 2000,
+        },
     }
 }
 
-
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Читатели не ждут писателей (WAL), соединение живёт между запросами,
+# а ожидание блокировки записи учитывается и попадает в лог
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            # Отрицательное значение — в КиБ: 64 МиБ страниц на соединение
+            'cache_size': -64 * 1024,
+            'mmap_size': 256 * 1024 * 1024,
+            'busy_timeout': 5000,
+            'lock_wait_warning': 200,
+        },
+    },
+    # Реплика для проверки на одной машине: второй файл SQLite, который
+    # копирует из default команда sync_replica
+    'replica': {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 5000,
+        },
+    },
 }
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# С каких баз читают страницы, которые только читают. Пустой список —
+# всё читается из default; для проверки реплики — ['replica']
+DATABASE_REPLICAS = []
+# На сколько секунд реплика может отставать: столько автор читает с
+# default после своей записи, и не дольше живёт закэшированное по
+# данным реплики
+REPLICA_MAX_LAG = 5
 
 
 # Password validation
@@ -141,3 +179,66 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 # Максимальное количество постов, выводимых на странице
 NUM_OF_POSTS_ON_PAGE = 10
+
+# Сколько соседних страниц показывать в навигации по обе стороны от текущей
+PAGINATOR_WINDOW = 2
+
+# Сколько последних постов хранить в материализованной ленте подписок
+TIMELINE_MAX_LENGTH = 500
+
+# Начиная с какого числа подписчиков посты автора не раскладываются
+# по лентам, а подмешиваются при чтении ленты подписок
+FEED_CELEBRITY_THRESHOLD = 1000
+
+# За сколько секунд рейтинг «горячих» постов теряет один порядок лайков
+HOT_SCORE_DECAY = 45000
+
+# Сколько авторов брать из каждой группы совпадений при поиске авторов
+AUTHOR_SEARCH_LIMIT = 50
+
+# Наибольшее число подсказок каждого вида в автодополнении
+TYPEAHEAD_LIMIT = 10
+# Через сколько секунд индекс подсказок перечитывается из базы
+TYPEAHEAD_MAX_AGE = 300
+
+# Время жизни фрагментов лент в кэше, секунды. Свежесть обеспечивают
+# версии лент, которые меняются при записи, так что срок может быть долгим
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Время жизни страниц, закэшированных целиком для анонимных читателей
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Пересчёт закэшированных значений одним процессом: аренда блокировки
+# и сколько секунд после истечения можно отдавать прежнее значение
+SINGLE_FLIGHT_LEASE = 10
+SINGLE_FLIGHT_STALE = 60
+# Склонность к досрочному пересчёту: больше — раньше
+SINGLE_FLIGHT_BETA = 1.0
+
+# Варианты картинок считаются в пуле процессов: число процессов
+# и через сколько секунд невыполненная задача ставится заново
+IMAGE_WORKERS = 2
+IMAGE_TASK_LEASE = 60
+# Считать варианты сразу в процессе, который ставит задачу, без пула.
+# Так работают тесты: их базы SQLite в памяти процессу пула не видны
+IMAGE_BUILD_INLINE = False
+# Ширины вариантов картинок постов, пикселей, и качество сжатия
+IMAGE_VARIANT_WIDTHS = (320, 640, 1024)
+IMAGE_VARIANT_QUALITY = 80
+# Метаданные миниатюр sorl хранятся в общем кэше, перед которым стоит
+# LRU процесса на столько записей. Удаления в других процессах LRU
+# замечает не позже чем через столько секунд
+THUMBNAIL_KVSTORE = 'core.kvstore.KVStore'
+THUMBNAIL_LRU_ENTRIES = 5000
+THUMBNAIL_LRU_MAX_AGE = 30
+
+# Загрузки пишутся сразу во временный файл и обрываются после
+# UPLOAD_MAX_BYTES байт
+FILE_UPLOAD_HANDLERS = ['core.uploadhandlers.LimitedUploadHandler']
+UPLOAD_MAX_BYTES = 20 * 1024 * 1024
+# Проверка и очистка картинок: предел пикселей, качество перекодирования
+# в JPEG, время одной задачи пула, секунды, и память процесса пула, байт
+IMAGE_MAX_PIXELS = 40 * 10 ** 6
+IMAGE_UPLOAD_QUALITY = 90
+IMAGE_TASK_TIMEOUT = 30
+IMAGE_WORKER_MEMORY = 512 * 1024 * 1024
@@ -0,0 +1,21 @@
+"""Настройки для manage.py test и pytest.
+
+Модуль выбирается через DJANGO_SETTINGS_MODULE, а окружение наследуют
+дочерние процессы: пул картинок, запущенный из теста, настроен так же,
+как сам тест.
+"""
+from .settings import *  # noqa: F401,F403
+
+# Кэш в памяти процесса: общий файл работающего сервера тесты не читают
+# и не очищают
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    }
+}
+
+# Варианты картинок считаются в процессе теста, с его базой
+IMAGE_BUILD_INLINE = True